@@ -4,39 +4,38 @@ from langgraph.graph import StateGraph, END, MessagesState,START
 from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.tools import tool
 from langchain_core.messages import HumanMessage
+import logging
 import uuid
 # file imports
-from config.vertex_config import vector_store, instruction, llm
-from config.db_config import save_message
+from config.vertex_config import instruction, get_llm
+from config.write_buffer import WriteBuffer
+from src.prompt_builder import PromptBuilder
+from src.retrieval import retrieve_context
+
+prompt_builder = PromptBuilder(instruction, get_llm)
+# Flushed in the background and at exit, so saving never waits on Mongo
+write_buffer = WriteBuffer()
 
 def call_model(state: MessagesState):
     user_input = state['messages'][-1].content
     history = state.get("history", [])
 
-    results = vector_store.similarity_search(user_input, k=5)
+    results, packing = retrieve_context(user_input, k=5)
+    logging.debug("Context tokens: %s", packing)
 
     context = ""
     for idx, doc in enumerate(results, 1):
         code = doc.metadata.get("code", f"Section {idx}")
+        if doc.metadata.get("clause"):
+            code = f"{code}, clause {doc.metadata['clause']}"
         context += f"[{code}]: {doc.page_content}\n"
 
-    history_lines = []
-    for m in state["messages"]:
-        if hasattr(m, "content"):
-            role = "User" if m.type == "human" else "Bot"
-            history_lines.append(f"{role}: {m.content}")
-
-    prompt = (
-        f"{instruction}\n\n"
-        f"Conversation so far:\n"
-        + "\n".join(history_lines)
-        + f"\n\nContext:\n{context}\n\nUser question: {user_input}\n\nAnswer:"
-    )
+    prompt, usage = prompt_builder.build(THREAD_ID, state["messages"][:-1], context, user_input)
 
     # STREAMING CHANGE STARTS HERE
     response_content = ""
     print("\nAssistant:", end=" ", flush=True)
-    for chunk in llm.stream(prompt):
+    for chunk in get_llm().stream(prompt):
         part = getattr(chunk, "content", chunk)
         print(part, end="", flush=True)
         response_content += part
@@ -77,7 +76,7 @@ def run_model():
         state["messages"].append(user_msg)
 
         # SAVE USER MESSAGE TO DB
-        save_message(THREAD_ID, {"role": "user", "content": user_msg.content})
+        write_buffer.save_message(THREAD_ID, {"role": "user", "content": user_msg.content})
 
         # Generate response
         state = app.invoke(state, config)
@@ -88,7 +87,7 @@ def run_model():
 
         # SAVE ASSISTANT MESSAGE TO DB
         ai_msg = state["messages"][-1]   # last message is always AI
-        save_message(THREAD_ID, {"role": "assistant", "content": ai_msg.content})
+        write_buffer.save_message(THREAD_ID, {"role": "assistant", "content": ai_msg.content})
 
 
 if __name__=="__main__":
@@ -0,0 +1,102 @@
+"""
+Cold start of the backend: time to import it, to answer /healthz, to report ready on /readyz,
+and the latency of the first requests, each measured in a fresh interpreter as a new container would.
+Runs with and without connection warmup (WARMUP=1 / WARMUP=0).
+
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --live    # use the real clients configured in .env
+
+By default the clients are the offline stand-ins of load_test.py, so the numbers cover the app's
+own startup; --live includes the Vertex SDK and Mongo connection setup.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_test import offline_environment, seed_store, ROOT
+
+READY_TIMEOUT = 120
+QUESTION = "What does ISO 9001:2015 clause 9.2 require for internal audit?"
+
+
+async def first_requests(app):
+    import httpx
+    timings = {}
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://coldstart",
+                                     timeout=READY_TIMEOUT) as client:
+            start = time.perf_counter()
+            await client.get("/healthz")
+            timings["healthz"] = time.perf_counter() - start
+            while (await client.get("/readyz")).status_code != 200:
+                if time.perf_counter() - start > READY_TIMEOUT:
+                    raise RuntimeError(f"Not ready after {READY_TIMEOUT}s")
+                await asyncio.sleep(0.005)
+            timings["ready"] = time.perf_counter() - start
+            for name, method, path, body in [("first /get_threads", "GET", "/get_threads", None),
+                                             ("first /chat", "POST", "/chat", {"message": QUESTION}),
+                                             ("second /chat", "POST", "/chat", {"message": QUESTION + " Briefly."})]:
+                request_start = time.perf_counter()
+                response = await client.request(method, path, json=body)
+                response.raise_for_status()
+                timings[name] = time.perf_counter() - request_start
+    return timings
+
+
+def child():
+    """One cold start: imports the backend and times the first requests; prints the timings as JSON."""
+    sys.path[:0] = [ROOT, os.path.join(ROOT, "web_app")]
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        import backend
+        timings = {"import": time.perf_counter() - start}
+        timings.update(asyncio.run(first_requests(backend.app)))
+    print(json.dumps(timings))
+
+
+def run_child(env):
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Cold start run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--live", action="store_true", help="use the clients configured in the environment")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM seconds to first token")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=200)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.live:
+            # Seed the index once here; each run then starts cold against the same data
+            offline_environment(tmp, args)
+            import random
+            with contextlib.redirect_stdout(sys.stderr):
+                seed_store(random.Random(0))
+        print(f"{args.runs} cold starts per mode ({'live clients' if args.live else 'offline stand-ins'}), median seconds")
+        for warmup in ("1", "0"):
+            runs = [run_child(dict(os.environ, WARMUP=warmup)) for _ in range(args.runs)]
+            print(f"WARMUP={warmup}")
+            for name in runs[0]:
+                values = [run[name] for run in runs]
+                print(f"  {name:<20} {statistics.median(values):8.3f}  (min {min(values):.3f}, max {max(values):.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmarks PDF text extraction: the previous path (PyPDFLoader plus a second PdfReader open for
+metadata, one page and one file at a time) against web_app/pdf_extract.iter_pdf_pages.
+
+    python benchmarks/bench_pdf_extract.py --files 4 --pages 300 --workers 1 2 4 8
+
+Synthetic multi-hundred-page PDFs are generated into a temporary directory first.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web_app"))
+from pdf_extract import iter_pdf_pages
+
+LINE = "6.4.{n} The organization shall determine and apply criteria for the evaluation of external providers"
+
+
+def write_synthetic_pdf(path, pages, lines_per_page=45):
+    """Writes a minimal valid PDF with `pages` pages of Helvetica text, without any PDF library."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for p in range(pages):
+        text = "".join(f"({LINE.format(n=p * lines_per_page + i)}) Tj T* " for i in range(lines_per_page))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def baseline(paths):
+    from langchain_community.document_loaders import PyPDFLoader
+    from PyPDF2 import PdfReader
+    pages = 0
+    for path in paths:
+        docs = PyPDFLoader(path).load()
+        PdfReader(path).metadata
+        pages += len(docs)
+    return pages
+
+
+def engine(paths, workers):
+    return sum(1 for _ in iter_pdf_pages(paths, workers=workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [os.path.join(tmp, f"synthetic_{i}.pdf") for i in range(args.files)]
+        for path in paths:
+            write_synthetic_pdf(path, args.pages)
+        total_pages = args.files * args.pages
+        print(f"{args.files} files x {args.pages} pages")
+
+        runs = [] if args.skip_baseline else [("baseline (PyPDFLoader + PyPDF2)", lambda: baseline(paths))]
+        runs += [(f"iter_pdf_pages workers={w}", lambda w=w: engine(paths, w)) for w in sorted(set(args.workers))]
+        for name, run in runs:
+            start = time.perf_counter()
+            pages = run()
+            elapsed = time.perf_counter() - start
+            assert pages == total_pages, f"{name} extracted {pages} of {total_pages} pages"
+            print(f"{name:<36} {elapsed:7.2f}s  {pages / elapsed:8.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
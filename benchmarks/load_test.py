@@ -0,0 +1,259 @@
+"""
+End-to-end load test of the FastAPI backend, fully offline: the embedder, vector store, LLM and
+Mongo are replaced by local stand-ins (hash embeddings, the local index, FakeLLM, mongomock), so
+the numbers measure the request path itself. Requests are replayed in-process through httpx's
+ASGI transport at a fixed concurrency, and latency percentiles and throughput are reported per endpoint.
+
+    python benchmarks/load_test.py --requests 500 --concurrency 32 --llm-latency 0.2
+    python benchmarks/load_test.py --record queries.jsonl     # save the generated query log
+    python benchmarks/load_test.py --log queries.jsonl        # replay a recorded one
+
+A query log is JSONL, one request per line: {"endpoint": "/chat", "message": ..., "thread_id": ...}.
+Endpoints: /chat, /chat/stream, /get_threads, /get_thread, /upload_pdf.
+Needs the dev requirements (requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STANDARDS = ["ISO 9001:2015", "ISO 14001:2015", "ISO/IEC 27001:2022", "ISO 45001:2018", "ISO 13485:2016",
+             "ISO 22000:2018", "ISO 50001:2018", "ISO 26262-6:2018"]
+TOPICS = ["risk assessment", "internal audit", "management review", "documented information",
+          "corrective action", "competence", "supplier evaluation", "monitoring and measurement"]
+CLAUSES = [("4.1", "Understanding the organization"), ("6.1", "Actions to address risks"),
+           ("7.5", "Documented information"), ("8.4", "Control of externally provided processes"),
+           ("9.2", "Internal audit"), ("10.2", "Nonconformity and corrective action")]
+DEFAULT_MIX = {"/chat": 40, "/chat/stream": 20, "/get_threads": 25, "/get_thread": 12, "/upload_pdf": 3}
+
+
+def offline_environment(tmp, args):
+    """Points every backend dependency at a local stand-in; must run before the backend is imported."""
+    os.environ.update(
+        VECTOR_BACKEND="local",
+        EMBEDDINGS_BACKEND="fake",
+        LLM_BACKEND="fake",
+        MONGO_URL="mongomock://localhost",
+        FAKE_LLM_LATENCY=str(args.llm_latency),
+        FAKE_LLM_TOKENS_PER_SEC=str(args.llm_tokens_per_sec),
+        LOCAL_INDEX_DIR=os.path.join(tmp, "vector_index"),
+        EMBEDDING_CACHE_PATH=os.path.join(tmp, "embedding_cache.sqlite"),
+        DEDUP_INDEX_PATH=os.path.join(tmp, "dedup_index.sqlite"),
+        STORE_VERSION_PATH=os.path.join(tmp, "store_version"),
+        BM25_INDEX_DIR=os.path.join(tmp, "bm25_index"),
+    )
+    sys.path[:0] = [ROOT, os.path.join(ROOT, "web_app"), os.path.dirname(os.path.abspath(__file__))]
+
+
+def standard_text(code, rng):
+    sections = []
+    for clause, title in CLAUSES:
+        lines = [f"The organization shall {rng.choice(TOPICS)} for {code} and retain evidence of "
+                 f"{rng.choice(TOPICS)} at planned intervals." for _ in range(rng.randint(4, 12))]
+        sections.append(f"{clause}\n{title}\n" + "\n".join(lines))
+    return "\n".join(sections)
+
+
+def seed_store(rng):
+    """Fills the local vector store with synthetic clause chunks for every standard."""
+    from langchain_core.documents import Document
+    from src.chunker import ClauseSplitter
+    from src.embed_docs import chunk_id
+    from config.vertex_config import get_vector_store
+    docs = [Document(page_content=standard_text(code, rng), metadata={"code": code, "title": f"{code} requirements"})
+            for code in STANDARDS]
+    chunks = ClauseSplitter().split_documents(docs)
+    get_vector_store().add_documents(chunks, ids=[chunk_id(c) for c in chunks])
+    return len(chunks)
+
+
+def seed_threads(count, messages_per_thread):
+    """Existing conversations, so thread listing and reads have realistic data behind them."""
+    from config import db_config
+    batch = {}
+    for i in range(count):
+        messages = []
+        for j in range(messages_per_thread):
+            role = "user" if j % 2 == 0 else "assistant"
+            messages.append({"role": role, "content": f"Seeded message {j} about {TOPICS[(i + j) % len(TOPICS)]}"})
+        batch[f"seed-{i}"] = (f"Seeded chat {i}", messages)
+    db_config.save_messages(batch)
+    db_config.ensure_indexes()
+
+
+def generate_log(count, threads, distinct, rng, mix=DEFAULT_MIX):
+    """A query log with the given endpoint mix; questions repeat so caches see realistic reuse."""
+    questions = [f"What does {rng.choice(STANDARDS)} clause {rng.choice(CLAUSES)[0]} require for {rng.choice(TOPICS)}?"
+                 for _ in range(distinct)]
+    endpoints, weights = zip(*mix.items())
+    log = []
+    for i in range(count):
+        endpoint = rng.choices(endpoints, weights)[0]
+        entry = {"endpoint": endpoint}
+        if endpoint in ("/chat", "/chat/stream"):
+            entry["message"] = rng.choice(questions)
+            # Half the questions open a new chat, the rest continue a seeded one
+            if rng.random() < 0.5:
+                entry["thread_id"] = f"seed-{rng.randrange(threads)}"
+        elif endpoint == "/get_thread":
+            entry["thread_id"] = f"seed-{rng.randrange(threads)}"
+        elif endpoint == "/upload_pdf":
+            entry["pages"] = rng.randint(2, 8)
+        log.append(entry)
+    return log
+
+
+async def send(client, entry, tmp, wait_for_jobs):
+    endpoint = entry["endpoint"]
+    if endpoint in ("/chat", "/chat/stream"):
+        body = {"message": entry["message"]}
+        if entry.get("thread_id"):
+            body["thread_id"] = entry["thread_id"]
+        response = await client.post(endpoint, json=body)
+    elif endpoint == "/get_threads":
+        response = await client.get("/get_threads", params={"limit": entry.get("limit", 50)})
+    elif endpoint == "/get_thread":
+        response = await client.get(f"/get_thread/{entry['thread_id']}")
+    elif endpoint == "/upload_pdf":
+        from bench_pdf_extract import write_synthetic_pdf
+        path = os.path.join(tmp, f"upload_{time.perf_counter_ns()}.pdf")
+        write_synthetic_pdf(path, entry.get("pages", 4))
+        with open(path, "rb") as f:
+            response = await client.post("/upload_pdf", files={"file": (os.path.basename(path), f.read(), "application/pdf")})
+        os.remove(path)
+        job_id = response.json().get("job_id") if response.status_code == 200 else None
+        while wait_for_jobs and job_id:
+            job = (await client.get(f"/jobs/{job_id}")).json()
+            if job["status"] not in ("queued", "running"):
+                break
+            await asyncio.sleep(0.05)
+    else:
+        raise ValueError(f"Unknown endpoint {endpoint}")
+    return response.status_code
+
+
+async def replay(app, log, concurrency, tmp, wait_for_jobs):
+    """Runs the log with `concurrency` requests in flight; returns ({endpoint: [(seconds, status)]}, wall time)."""
+    import httpx
+    results = {}
+    queue = asyncio.Queue()
+    for entry in log:
+        queue.put_nowait(entry)
+
+    async def worker(client):
+        while not queue.empty():
+            entry = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                status = await send(client, entry, tmp, wait_for_jobs)
+            except Exception as e:
+                print(f"{entry['endpoint']} failed: {e!r}", file=sys.__stderr__)
+                status = 0
+            results.setdefault(entry["endpoint"], []).append((time.perf_counter() - start, status))
+
+    # The ASGI transport does not run startup/shutdown hooks, so run the app's lifespan around the replay
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=300) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+            wall = time.perf_counter() - start
+    return results, wall
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(results, wall):
+    rows = {}
+    everything = []
+    for endpoint, samples in sorted(results.items()):
+        latencies = sorted(s for s, _ in samples)
+        everything += latencies
+        rows[endpoint] = {
+            "requests": len(samples),
+            "errors": sum(1 for _, status in samples if not 200 <= status < 300),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "req_per_s": len(samples) / wall,
+        }
+    everything.sort()
+    rows["all"] = {
+        "requests": len(everything),
+        "errors": sum(r["errors"] for r in rows.values()),
+        "p50_ms": percentile(everything, 50) * 1000,
+        "p95_ms": percentile(everything, 95) * 1000,
+        "p99_ms": percentile(everything, 99) * 1000,
+        "req_per_s": len(everything) / wall,
+    }
+    return rows
+
+
+def print_report(rows, wall):
+    print(f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for endpoint, r in rows.items():
+        print(f"{endpoint:<14} {r['requests']:>8} {r['errors']:>6} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['req_per_s']:>8.1f}")
+    print(f"wall time {wall:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="generated log size")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--log", help="replay this JSONL query log instead of generating one")
+    parser.add_argument("--record", help="write the generated query log here")
+    parser.add_argument("--distinct", type=int, default=50, help="distinct questions in a generated log")
+    parser.add_argument("--threads", type=int, default=100, help="seeded conversations")
+    parser.add_argument("--thread-messages", type=int, default=20, help="messages per seeded conversation")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM seconds to first token")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=200)
+    parser.add_argument("--wait-for-jobs", action="store_true", help="time uploads until ingestion finishes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results as JSON, for comparing runs")
+    parser.add_argument("--verbose", action="store_true", help="keep the backend's own logging")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        offline_environment(tmp, args)
+        if args.log:
+            with open(args.log, encoding="utf-8") as f:
+                log = [json.loads(line) for line in f if line.strip()]
+        else:
+            log = generate_log(args.requests, args.threads, args.distinct, rng)
+            if args.record:
+                with open(args.record, "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(entry) + "\n" for entry in log)
+
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            import backend
+            chunks = seed_store(rng)
+            seed_threads(args.threads, args.thread_messages)
+            results, wall = asyncio.run(replay(backend.app, log, args.concurrency, tmp, args.wait_for_jobs))
+
+        print(f"{len(log)} requests, concurrency {args.concurrency}, {chunks} chunks, {args.threads} seeded threads, "
+              f"LLM latency {args.llm_latency}s at {args.llm_tokens_per_sec:g} tokens/s")
+        rows = summarize(results, wall)
+        print_report(rows, wall)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"args": vars(args), "wall_s": wall, "endpoints": rows}, f, indent=2)
+        sys.exit(1 if rows["all"]["errors"] else 0)
+
+
+if __name__ == "__main__":
+    main()
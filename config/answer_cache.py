@@ -0,0 +1,162 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Cosine similarity of query embeddings above which a differently worded question reuses an answer
+# computed from the same chunks; 0 disables the semantic lookup
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+# Touched whenever ingestion adds chunks; answers cached before that are discarded
+STORE_VERSION_PATH = os.getenv(
+    "STORE_VERSION_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "store_version"),
+)
+
+SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    return SPACE_RE.sub(" ", question.strip().lower()).rstrip(" ?!.")
+
+
+def history_digest(messages):
+    """Hash of the prior conversation; answers are only shared between identical conversations."""
+    h = hashlib.sha256()
+    for m in messages:
+        role = m["role"] if isinstance(m, dict) else m.type
+        content = m["content"] if isinstance(m, dict) else m.content
+        h.update(f"{role}\0{content}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def bump_store_version(path=STORE_VERSION_PATH):
+    """Marks the vector store as changed, invalidating cached answers in every process that uses it."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+
+
+class AnswerCache:
+    """
+    LRU + TTL cache of generated answers, keyed on the normalized question, the ids of the chunks
+    retrieved for it and a digest of the prior conversation. With `similarity` > 0, a question that
+    misses the exact key may reuse an answer built from the same chunks and history whose query
+    embedding is at least that similar (`embed_fn` embeds the question). Everything cached is
+    dropped when the store version file changes.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, similarity=ANSWER_CACHE_SIMILARITY,
+                 embed_fn=None, version_path=STORE_VERSION_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity if embed_fn else 0
+        self.embed_fn = embed_fn
+        self.version_path = version_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (answer, context_key, vector, stored_at)
+        self._by_context = {}  # context_key -> {key}, for the semantic lookup
+        self._version = self._store_version()
+        self._lock = threading.Lock()
+
+    def _store_version(self):
+        try:
+            return os.stat(self.version_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def context_key(chunk_ids, history):
+        h = hashlib.sha256()
+        for chunk_id in chunk_ids:
+            h.update(f"{chunk_id}\0".encode("utf-8"))
+        h.update(history_digest(history).encode("utf-8"))
+        return h.hexdigest()
+
+    @staticmethod
+    def key(question, context_key):
+        return hashlib.sha256(f"{normalize_question(question)}\0{context_key}".encode("utf-8")).hexdigest()
+
+    def _check_version(self):
+        version = self._store_version()
+        if version != self._version:
+            self._entries.clear()
+            self._by_context.clear()
+            self._version = version
+
+    def _drop(self, key):
+        _, context_key, _, _ = self._entries.pop(key)
+        keys = self._by_context.get(context_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[context_key]
+
+    def _embed(self, question):
+        vector = np.asarray(self.embed_fn(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get(self, question, chunk_ids, history):
+        """Cached answer for this question over these chunks and history, or None."""
+        context_key = self.context_key(chunk_ids, history)
+        key = self.key(question, context_key)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry and now - entry[3] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            candidates = [k for k in self._by_context.get(context_key, ()) if now - self._entries[k][3] <= self.ttl]
+        if self.similarity and candidates:
+            vector = self._embed(question)
+            with self._lock:
+                best, best_score = None, self.similarity
+                for k in candidates:
+                    entry = self._entries.get(k)
+                    if entry is not None and entry[2] is not None:
+                        score = float(vector @ entry[2])
+                        if score >= best_score:
+                            best, best_score = k, score
+                if best is not None:
+                    self._entries.move_to_end(best)
+                    self.hits += 1
+                    return self._entries[best][0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, question, chunk_ids, history, answer):
+        context_key = self.context_key(chunk_ids, history)
+        key = self.key(question, context_key)
+        vector = self._embed(question) if self.similarity else None
+        with self._lock:
+            self._check_version()
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (answer, context_key, vector, time.monotonic())
+            self._by_context.setdefault(context_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
@@ -1,37 +1,222 @@
 import os
-from pymongo import MongoClient
+from datetime import datetime, timezone
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
+# file imports
+from config.lazy import lazy
 
 load_dotenv()
 
 mongo_cluster=os.getenv("MONGO_URL")
+DB_NAME = "iso-bot-db"
 
-client = MongoClient(mongo_cluster)
-db = client["iso-bot-db"]
-threads = db["threads"]
+@lazy
+def get_client():
+    """The shared MongoClient, created on first use rather than at import."""
+    if mongo_cluster and mongo_cluster.startswith("mongomock://"):
+        # In-memory Mongo for offline runs and benchmarks (mongomock is a dev dependency)
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(mongo_cluster)
+
+def threads():
+    return get_client()[DB_NAME]["threads"]
+
+def message_buckets():
+    # Messages live in fixed-size buckets, {thread_id, bucket, messages: [{seq, role, content}]}, so no
+    # thread document grows without bound. Threads written before bucketing keep a legacy `messages` array.
+    return get_client()[DB_NAME]["message_buckets"]
+
+def ingested_files():
+    return get_client()[DB_NAME]["ingested_files"]
+
+PREVIEW_CHARS = 50
+THREADS_PAGE_SIZE = int(os.getenv("THREADS_PAGE_SIZE", "50"))
+# Fields kept up to date on every write, so thread listing never reads message bodies
+LISTING_FIELDS = {"_id": 0, "thread_id": 1, "title": 1, "preview": 1, "message_count": 1, "updated_at": 1}
+BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "100"))
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "50"))
+
+def now():
+    # Mongo stores milliseconds; truncating keeps pagination cursors exact
+    t = datetime.now(timezone.utc)
+    return t.replace(microsecond=t.microsecond // 1000 * 1000)
+
+def backfill_thread_fields():
+    """One-off migration: derives preview, message_count and updated_at for threads written before they existed."""
+    updated = 0
+    for t in threads().find({"updated_at": {"$exists": False}}, {"thread_id": 1, "messages": 1}):
+        messages = t.get("messages") or []
+        # A thread a message was saved to since the find already has its fields (see reserve_seqs)
+        threads().update_one({"_id": t["_id"], "updated_at": {"$exists": False}}, {"$set": {
+            "preview": messages[-1]["content"][:PREVIEW_CHARS] if messages else "",
+            "message_count": len(messages),
+            "updated_at": t["_id"].generation_time,
+        }})
+        updated += 1
+    if updated:
+        print(f"Backfilled listing fields on {updated} threads.")
+
+def ensure_indexes():
+    """Creates the indexes every query relies on. Safe to call on each startup."""
+    backfill_thread_fields()
+    try:
+        threads().create_index([("thread_id", ASCENDING)], unique=True)
+    except OperationFailure as e:
+        # Legacy duplicates block the unique index; fall back to a plain one rather than failing startup
+        print("Could not create unique thread_id index, using a non-unique one\n", e)
+        threads().create_index([("thread_id", ASCENDING)])
+    threads().create_index([("updated_at", DESCENDING), ("thread_id", DESCENDING)])
+    message_buckets().create_index([("thread_id", ASCENDING), ("bucket", ASCENDING)], unique=True)
+    ingested_files().create_index([("file_hash", ASCENDING)], unique=True)
 
 def delete_db():
-    client.drop_database("iso-bot-db")
+    get_client().drop_database(DB_NAME)
     print("Database deleted!")
 
+def reserve_seqs(thread_id, count, last_content, title=None):
+    """
+    Reserves `count` sequence numbers on the thread document, updating its listing fields, and returns
+    the first. A thread not yet backfilled (see backfill_thread_fields) starts counting after its legacy
+    `messages` array, so new messages never take the sequence numbers of the ones it already holds.
+    """
+    fields = {
+        "message_count": {"$add": [{"$ifNull": ["$message_count", {"$size": {"$ifNull": ["$messages", []]}}]},
+                                   count]},
+        # Literals, or content starting with "$" would be read as a field path
+        "preview": {"$literal": last_content[:PREVIEW_CHARS]},
+        "updated_at": {"$literal": now()},
+    }
+    if title:  # Only set title if provided and the thread has none
+        fields["title"] = {"$ifNull": ["$title", {"$literal": title}]}
+    thread = threads().find_one_and_update(
+        {"thread_id": thread_id},
+        [{"$set": fields}],
+        projection={"message_count": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return thread["message_count"] - count
+
 def save_message(thread_id, message, title="None"):
-    update_fields = {"$push": {"messages": message}}
-    if title:  # Only set title if provided and thread is new
-        update_fields["$setOnInsert"] = {"title": title}
-    threads.update_one(
+    """
+    Reserves the next sequence number on the thread document (which also keeps the listing fields
+    current), then appends the message to the bucket that sequence number falls in.
+    """
+    seq = reserve_seqs(thread_id, 1, message["content"], title)
+    message_buckets().update_one(
+        {"thread_id": thread_id, "bucket": seq // BUCKET_SIZE},
+        {"$push": {"messages": dict(message, seq=seq)}},
+        upsert=True
+    )
+
+def save_messages(batch):
+    """
+    Stores buffered messages: `batch` is {thread_id: (title, [messages])}. Each thread reserves its
+    whole range of sequence numbers with one update, and all bucket appends go out in one bulk_write.
+    Messages get their `seq` set in place, so a batch retried after a failed bulk_write keeps the
+    sequence numbers it already reserved instead of reserving new ones (a bucket append that is
+    repeated is harmless, reads key messages by seq).
+    """
+    bucket_ops = {}
+    for thread_id, (title, messages) in batch.items():
+        unreserved = [m for m in messages if "seq" not in m]
+        if unreserved:
+            first = reserve_seqs(thread_id, len(unreserved), messages[-1]["content"], title)
+            for seq, message in enumerate(unreserved, first):
+                message["seq"] = seq
+        for message in messages:
+            bucket_ops.setdefault((thread_id, message["seq"] // BUCKET_SIZE), []).append(message)
+    if bucket_ops:
+        message_buckets().bulk_write([
+            UpdateOne({"thread_id": thread_id, "bucket": bucket}, {"$push": {"messages": {"$each": messages}}},
+                      upsert=True)
+            for (thread_id, bucket), messages in bucket_ops.items()
+        ], ordered=False)
+
+def ping():
+    """Round trip to the server; opens a pooled connection ahead of the first request."""
+    get_client().admin.command("ping")
+
+def create_thread(thread_id, title):
+    threads().update_one(
         {"thread_id": thread_id},
-        update_fields,
+        {"$setOnInsert": {"thread_id": thread_id, "title": title, "preview": "",
+                          "message_count": 0, "updated_at": now()}},
         upsert=True
     )
-    
-def get_all_threads():
-    # Get thread_id and last message (or some preview)
-    thread_list = []
-    for t in threads.find({}, {"thread_id": 1, "messages": 1}):
-        last_msg = t["messages"][-1]["content"] if t.get("messages") else ""
-        thread_list.append({"thread_id": t["thread_id"], "preview": last_msg[:50]})
-    return thread_list
+
+def update_thread_title(thread_id, title):
+    threads().update_one({"thread_id": thread_id}, {"$set": {"title": title}})
+
+def read_messages(thread_id, start, end):
+    """Messages with start <= seq < end, from the legacy array and the buckets covering that range."""
+    if end <= start:
+        return []
+    found = {}
+    legacy = threads().find_one({"thread_id": thread_id}, {"messages": {"$slice": [start, end - start]}})
+    for offset, message in enumerate((legacy or {}).get("messages") or []):
+        found[start + offset] = message
+    for bucket in message_buckets().find(
+        {"thread_id": thread_id, "bucket": {"$gte": start // BUCKET_SIZE, "$lte": (end - 1) // BUCKET_SIZE}},
+        {"_id": 0, "messages": 1},
+    ):
+        for message in bucket["messages"]:
+            if start <= message["seq"] < end:
+                found[message["seq"]] = {k: v for k, v in message.items() if k != "seq"}
+    return [found[seq] for seq in sorted(found)]
+
+def thread_message_count(thread_id):
+    thread = threads().find_one({"thread_id": thread_id}, {"message_count": 1})
+    return None if thread is None else thread.get("message_count", 0)
+
+def get_thread_page(thread_id, before=None, limit=MESSAGES_PAGE_SIZE):
+    """
+    The `limit` messages preceding sequence number `before` (default: the newest ones), oldest first.
+    Returns {"messages", "has_more", "next_before"}; pass next_before back to load the page before this one.
+    """
+    count = thread_message_count(thread_id)
+    if count is None:
+        return {"messages": [], "has_more": False, "next_before": None}
+    end = count if before is None else max(0, min(before, count))
+    start = 0 if limit is None else max(0, end - limit)
+    return {"messages": read_messages(thread_id, start, end), "has_more": start > 0,
+            "next_before": start if start > 0 else None}
+
+def encode_cursor(thread):
+    return f"{int(thread['updated_at'].replace(tzinfo=timezone.utc).timestamp() * 1000)}_{thread['thread_id']}"
+
+def decode_cursor(cursor):
+    millis, thread_id = cursor.split("_", 1)
+    return datetime.fromtimestamp(int(millis) / 1000, tz=timezone.utc), thread_id
+
+def list_threads(after=None, limit=THREADS_PAGE_SIZE):
+    """
+    One page of threads, most recently active first, without reading message bodies.
+    `after` is the `next_after` cursor of the previous page; returns (threads, next_after or None).
+    """
+    query = {}
+    if after:
+        updated_at, thread_id = decode_cursor(after)
+        query = {"$or": [{"updated_at": {"$lt": updated_at}},
+                         {"updated_at": updated_at, "thread_id": {"$lt": thread_id}}]}
+    page = list(threads().find(query, LISTING_FIELDS)
+                .sort([("updated_at", DESCENDING), ("thread_id", DESCENDING)])
+                .limit(limit + 1))
+    next_after = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_after
 
 def get_thread_messages(thread_id):
-    doc = threads.find_one({"thread_id": thread_id})
-    return doc["messages"] if doc and "messages" in doc else []
+    """Every message of the thread, oldest first."""
+    return get_thread_page(thread_id, limit=None)["messages"]
+
+def get_ingested_file(file_hash):
+    return ingested_files().find_one({"file_hash": file_hash}, {"_id": 0})
+
+def mark_file_ingested(file_hash, filename, chunks):
+    ingested_files().update_one(
+        {"file_hash": file_hash},
+        {"$setOnInsert": {"file_hash": file_hash, "filename": filename, "chunks": chunks}},
+        upsert=True
+    )
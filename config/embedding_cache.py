@@ -0,0 +1,121 @@
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "embedding_cache.sqlite"),
+)
+
+# SQLite's default limit on bound parameters is 999
+LOOKUP_BATCH = 900
+# Query embeddings are kept in memory only, for the most recent this many distinct queries
+QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", "1024"))
+
+
+def cache_key(model_name, text, kind="document"):
+    """Content hash of (model, task kind, text); query and document embeddings can differ for the same text."""
+    h = hashlib.sha256()
+    for part in (model_name, kind, text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model with a persistent SQLite cache of document embeddings keyed by content hash.
+    Cached vectors are returned directly and only the misses are sent to the model, in batches.
+    Query text rarely repeats across restarts, so query embeddings only go in a small in-memory LRU
+    (the same question is often embedded twice in one request, by the answer cache and by retrieval).
+    """
+
+    def __init__(self, base, model_name=None, path=EMBEDDING_CACHE_PATH, batch_size=250,
+                 query_cache_size=QUERY_CACHE_SIZE):
+        self.base = base
+        self.model_name = model_name or getattr(base, "model_name", None) or type(base).__name__
+        self.path = path
+        self.batch_size = batch_size
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[i:i + LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in items],
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        keys = [cache_key(self.model_name, t) for t in texts]
+        found = self._lookup(list(set(keys)))
+
+        # Identical texts in one call are embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        miss_keys = list(missing)
+        for i in range(0, len(miss_keys), self.batch_size):
+            batch = miss_keys[i:i + self.batch_size]
+            vectors = self.base.embed_documents([missing[k] for k in batch])
+            self._store(zip(batch, vectors))
+            found.update(zip(batch, vectors))
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text):
+        with self._lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                self.hits += 1
+                return vector
+        vector = self.base.embed_query(text)
+        with self._lock:
+            self.misses += 1
+            if self.query_cache_size > 0:
+                self._queries[text] = vector
+                while len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+        return vector
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
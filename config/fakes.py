@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import re
+import time
+import zlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic, offline embedder for tests and local runs.
+    Each token is hashed into a signed bucket, so texts sharing words get similar vectors.
+    """
+
+    def __init__(self, dim=256, model_name="hash-embeddings"):
+        self.dim = dim
+        self.model_name = model_name
+
+    def _embed(self, text):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN_RE.findall(text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            h = int.from_bytes(digest, "little")
+            sign = 1.0 if h & 1 else -1.0
+            vec[(h >> 1) % self.dim] += sign
+        norm = np.linalg.norm(vec)
+        if norm:
+            vec /= norm
+        return vec.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+ANSWER_WORDS = ("the organization shall determine monitor measure analyse and evaluate documented information "
+                "as per clause requirements for conformity of products and services").split()
+
+
+class FakeLLM(LLM):
+    """
+    Offline stand-in for the chat model, for benchmarks and local runs. Each answer waits `latency`
+    seconds (time to first token), then produces `answer_tokens` words at `tokens_per_second`.
+    The answer depends only on the prompt, so runs are repeatable.
+    """
+
+    latency: float = 0.5
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60
+    model_name: str = "fake-llm"
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _words(self, prompt):
+        seed = zlib.crc32(prompt.encode("utf-8"))
+        words = [ANSWER_WORDS[(seed + i * 7) % len(ANSWER_WORDS)] for i in range(self.answer_tokens)]
+        return ["- "] + [w + " " for w in words]
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        words = self._words(prompt)
+        time.sleep(self.latency + len(words) / self.tokens_per_second)
+        return "".join(words)
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        words = self._words(prompt)
+        await asyncio.sleep(self.latency + len(words) / self.tokens_per_second)
+        return "".join(words)
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for word in self._words(prompt):
+            time.sleep(1 / self.tokens_per_second)
+            yield GenerationChunk(text=word)
+
+    async def _astream(self, prompt, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for word in self._words(prompt):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield GenerationChunk(text=word)
@@ -0,0 +1,23 @@
+import functools
+import threading
+
+
+def lazy(factory):
+    """
+    Turns a zero-argument factory into a cached, thread-safe getter: the first call builds the
+    object, concurrent first calls wait for that one build, and later calls return it. A factory
+    that raises is retried on the next call.
+    """
+    lock = threading.Lock()
+    built = []
+
+    @functools.wraps(factory)
+    def getter():
+        if built:
+            return built[0]
+        with lock:
+            if not built:
+                built.append(factory())
+        return built[0]
+
+    return getter
@@ -0,0 +1,314 @@
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+load_dotenv()
+
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "vector_index"),
+)
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f32"
+CHUNKS_FILE = "chunks.jsonl"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGN_FILE = "ivf_assign.npy"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store: a memory-mapped float32 matrix of unit-normalized
+    embeddings plus a JSONL sidecar holding each row's id, text and metadata.
+    Top-k is an exact dot-product scan, or an IVF probe once `build_ivf` has run.
+    """
+
+    def __init__(self, embedding, path=LOCAL_INDEX_DIR, nprobe=8):
+        self._embedding = embedding
+        self.path = path
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta = {"dim": 0, "count": 0}
+        if os.path.exists(self._file(META_FILE)):
+            with open(self._file(META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+
+        # Only the first `count` rows are trusted; meta.json is written last
+        self._chunks = []
+        if self.count:
+            with open(self._file(CHUNKS_FILE), "r", encoding="utf-8") as f:
+                for line in f:
+                    if len(self._chunks) == self.count:
+                        break
+                    self._chunks.append(json.loads(line))
+        self._truncate_tail()
+        self._id_to_row = {c["id"]: row for row, c in enumerate(self._chunks)}
+        self._code_rows = {}
+        for row, c in enumerate(self._chunks):
+            self._index_codes(row, c["metadata"])
+        self._map_matrix()
+
+        self._centroids = None
+        self._assign = None
+        if os.path.exists(self._file(IVF_CENTROIDS_FILE)) and os.path.exists(self._file(IVF_ASSIGN_FILE)):
+            self._centroids = np.load(self._file(IVF_CENTROIDS_FILE))
+            self._assign = np.load(self._file(IVF_ASSIGN_FILE))
+
+    def _truncate_tail(self):
+        """
+        Drops rows an interrupted `add_texts` appended after the last meta.json write,
+        so the next append lands right after the trusted rows.
+        """
+        vectors = self._file(VECTORS_FILE)
+        if os.path.exists(vectors) and os.path.getsize(vectors) > self.count * self.dim * 4:
+            os.truncate(vectors, self.count * self.dim * 4)
+        chunks = self._file(CHUNKS_FILE)
+        if os.path.exists(chunks):
+            with open(chunks, "rb") as f:
+                for _ in range(self.count):
+                    f.readline()
+                trusted = f.tell()
+                extra = f.read(1)
+            if extra:
+                os.truncate(chunks, trusted)
+
+    def _index_codes(self, row, metadata):
+        # Deduplicated chunks list every standard they were found in under "codes"
+        for code in metadata.get("codes") or [metadata.get("code")]:
+            self._code_rows.setdefault(code, []).append(row)
+
+    def index_shared_codes(self, shared):
+        """
+        Lets the code filter find chunks under standards that are not in their metadata:
+        {chunk id: [codes]}, e.g. the near-copies merged into a canonical chunk (see src.dedup).
+        """
+        with self._lock:
+            for chunk_id, codes in shared.items():
+                row = self._id_to_row.get(chunk_id)
+                if row is None:
+                    continue
+                for code in codes:
+                    rows = self._code_rows.setdefault(code, [])
+                    if row not in rows:
+                        rows.append(row)
+
+    def _unindex_codes(self, row, metadata):
+        for code in metadata.get("codes") or [metadata.get("code")]:
+            self._code_rows[code].remove(row)
+
+    def _map_matrix(self):
+        if self.count:
+            self._matrix = np.memmap(
+                self._file(VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.count, self.dim)
+            )
+        else:
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+    def _write_meta(self):
+        tmp = self._file(META_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count}, f)
+        os.replace(tmp, self._file(META_FILE))
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = _normalize(self._embedding.embed_documents(texts))
+
+        with self._lock:
+            if not self.dim:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} does not match index dim {self.dim}")
+
+            # Upsert: known ids are overwritten in place, new ids are appended
+            updates = [(self._id_to_row[i], i, t, m, v)
+                       for i, t, m, v in zip(ids, texts, metadatas, vectors) if i in self._id_to_row]
+            new_rows = [(i, t, m, v) for i, t, m, v in zip(ids, texts, metadatas, vectors) if i not in self._id_to_row]
+
+            if updates:
+                matrix = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r+", shape=(self.count, self.dim))
+                for row, i, t, m, v in updates:
+                    matrix[row] = v
+                    self._unindex_codes(row, self._chunks[row]["metadata"])
+                    self._index_codes(row, m)
+                    self._chunks[row] = {"id": i, "text": t, "metadata": m}
+                matrix.flush()
+                del matrix
+                tmp = self._file(CHUNKS_FILE + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for c in self._chunks:
+                        f.write(json.dumps(c, ensure_ascii=False) + "\n")
+                os.replace(tmp, self._file(CHUNKS_FILE))
+
+            if new_rows:
+                with open(self._file(VECTORS_FILE), "ab") as f:
+                    np.stack([r[3] for r in new_rows]).astype(np.float32).tofile(f)
+                with open(self._file(CHUNKS_FILE), "a", encoding="utf-8") as f:
+                    for i, t, m, _ in new_rows:
+                        f.write(json.dumps({"id": i, "text": t, "metadata": m}, ensure_ascii=False) + "\n")
+                for i, t, m, _ in new_rows:
+                    row = len(self._chunks)
+                    self._chunks.append({"id": i, "text": t, "metadata": m})
+                    self._id_to_row[i] = row
+                    self._index_codes(row, m)
+                self.count = len(self._chunks)
+                self._write_meta()
+
+            self._map_matrix()
+            if self._centroids is not None:
+                self._assign = np.argmax(self._matrix @ self._centroids.T, axis=1).astype(np.int32)
+                np.save(self._file(IVF_ASSIGN_FILE), self._assign)
+        return ids
+
+    def _filter_rows(self, filter):
+        """Returns the row ids matching a {key: value or [values]} metadata filter, or None for no filter."""
+        if not filter:
+            return None
+        rows = None
+        for key, wanted in filter.items():
+            wanted = set(wanted) if isinstance(wanted, (list, tuple, set)) else {wanted}
+            if key == "code":
+                matched = set()
+                for code in wanted:
+                    matched.update(self._code_rows.get(code, []))
+            else:
+                matched = {r for r, c in enumerate(self._chunks) if c["metadata"].get(key) in wanted}
+            rows = matched if rows is None else rows & matched
+        return np.fromiter(sorted(rows), dtype=np.int64)
+
+    def _probe_rows(self, query, centroids, assign):
+        centroid_scores = centroids @ query
+        nprobe = min(self.nprobe, len(centroid_scores))
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.flatnonzero(np.isin(assign, probed))
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, **kwargs):
+        # Snapshot under the lock and scan without it, so concurrent searches don't queue behind each other.
+        # Writers only append rows, replace whole rows and map a new matrix, so the snapshot stays usable
+        with self._lock:
+            if not self.count:
+                return []
+            matrix, chunks = self._matrix, self._chunks
+            centroids, assign = self._centroids, self._assign
+            rows = self._filter_rows(filter)
+        query = _normalize(embedding)
+        if rows is None and centroids is not None:
+            rows = self._probe_rows(query, centroids, assign)
+        if rows is not None:
+            matrix = matrix[rows]
+        if not len(matrix):
+            return []
+        scores = matrix @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            row = int(i) if rows is None else int(rows[i])
+            chunk = chunks[row]
+            doc = Document(page_content=chunk["text"], metadata=dict(chunk["metadata"]), id=chunk["id"])
+            results.append((doc, float(scores[i])))
+        return results
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter, **kwargs)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, **kwargs)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def get_by_ids(self, ids):
+        return [
+            Document(page_content=c["text"], metadata=dict(c["metadata"]), id=c["id"])
+            for c in (self._chunks[self._id_to_row[i]] for i in ids if i in self._id_to_row)
+        ]
+
+    def get_vectors(self, ids):
+        """Stored (normalized) vectors for `ids`, with None for ids not in the index."""
+        with self._lock:
+            rows = [self._id_to_row.get(i) for i in ids]
+            return [None if row is None else np.array(self._matrix[row]) for row in rows]
+
+    def build_ivf(self, nlist=64, iterations=10, seed=0):
+        """
+        Clusters the stored vectors with spherical k-means so searches only scan the `nprobe` closest partitions.
+        """
+        with self._lock:
+            if self.count < nlist:
+                raise ValueError(f"Need at least {nlist} vectors to build {nlist} partitions, have {self.count}")
+            matrix = np.asarray(self._matrix)
+            rng = np.random.default_rng(seed)
+            centroids = matrix[rng.choice(self.count, nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assign = np.argmax(matrix @ centroids.T, axis=1)
+                for c in range(nlist):
+                    members = matrix[assign == c]
+                    if len(members):
+                        centroids[c] = members.sum(axis=0)
+                centroids = _normalize(centroids)
+            self._centroids = centroids.astype(np.float32)
+            self._assign = np.argmax(matrix @ self._centroids.T, axis=1).astype(np.int32)
+            np.save(self._file(IVF_CENTROIDS_FILE), self._centroids)
+            np.save(self._file(IVF_ASSIGN_FILE), self._assign)
+            print(f"Built IVF index with {nlist} partitions over {self.count} vectors.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=LOCAL_INDEX_DIR, **kwargs):
+        store = cls(embedding, path=path, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+if __name__ == "__main__":
+    import argparse
+    from config.fakes import HashEmbeddings
+
+    parser = argparse.ArgumentParser(description="Maintain the local vector index")
+    parser.add_argument("command", choices=["build-ivf", "stats"])
+    parser.add_argument("--path", default=LOCAL_INDEX_DIR)
+    parser.add_argument("--nlist", type=int, default=64)
+    args = parser.parse_args()
+
+    # The embedder is never called by these commands
+    store = LocalVectorStore(HashEmbeddings(), path=args.path)
+    if args.command == "build-ivf":
+        store.build_ivf(nlist=args.nlist)
+    else:
+        print(f"{store.count} vectors of dim {store.dim} in {store.path}"
+              f" ({'IVF' if store._centroids is not None else 'exact'} search)")
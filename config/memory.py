@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from langgraph.checkpoint.memory import MemorySaver
+
+load_dotenv()
+
+HISTORY_CACHE_THREADS = int(os.getenv("HISTORY_CACHE_THREADS", "1000"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "3600"))
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that keeps at most `max_threads` threads, evicting the least recently used
+    and any thread idle for longer than `ttl` seconds. Evicted threads are reloaded from Mongo.
+    """
+
+    def __init__(self, max_threads=HISTORY_CACHE_THREADS, ttl=HISTORY_CACHE_TTL, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._last_used = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+    def _evict(self, now):
+        expired = []
+        with self._lru_lock:
+            while self._last_used:
+                thread_id, last_used = next(iter(self._last_used.items()))
+                if len(self._last_used) > self.max_threads or now - last_used > self.ttl:
+                    self._last_used.popitem(last=False)
+                    expired.append(thread_id)
+                else:
+                    break
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+
+    def _touch(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        now = time.monotonic()
+        with self._lru_lock:
+            self._last_used[thread_id] = now
+            self._last_used.move_to_end(thread_id)
+        self._evict(now)
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        now = time.monotonic()
+        with self._lru_lock:
+            last_used = self._last_used.get(thread_id)
+        if last_used is not None and now - last_used > self.ttl:
+            self._evict(now)
+            return None
+        return super().get_tuple(config)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self._touch(config)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self._touch(config)
+        return super().put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id):
+        with self._lru_lock:
+            self._last_used.pop(thread_id, None)
+        super().delete_thread(thread_id)
@@ -0,0 +1,73 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dotenv import load_dotenv
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+load_dotenv()
+
+# Set SERVER_TIMING=1 to return each request's stage timings in a Server-Timing response header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_SECONDS = Histogram("isobot_request_seconds", "HTTP request latency",
+                            ["method", "route", "status"], buckets=SECONDS_BUCKETS)
+STAGE_SECONDS = Histogram("isobot_stage_seconds", "Time spent in one stage of a request or ingestion job",
+                          ["stage"], buckets=SECONDS_BUCKETS)
+STAGE_ERRORS = Counter("isobot_stage_errors_total", "Stages that raised an exception", ["stage"])
+PROMPT_TOKENS = Histogram("isobot_prompt_tokens", "Estimated prompt tokens per answer",
+                          buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+CONTEXT_CHARS = Histogram("isobot_context_chars", "Characters of retrieved context per question",
+                          buckets=(500, 1000, 2000, 4000, 8000, 16000, 32000))
+CONTEXT_TOKENS = Histogram("isobot_context_tokens", "Estimated tokens of packed context per question",
+                           buckets=(250, 500, 1000, 2000, 4000, 8000))
+CONTEXT_TOKENS_SAVED = Counter("isobot_context_tokens_saved_total",
+                               "Estimated context tokens saved by merging and packing, against the raw top-k chunks")
+RETRIEVAL_K = Histogram("isobot_retrieval_k", "Chunks placed in the context per question",
+                        buckets=(0, 1, 2, 3, 5, 8, 13, 20))
+ANSWER_CACHE_LOOKUPS = Counter("isobot_answer_cache_lookups_total", "Answer cache lookups", ["result"])
+INGESTED_CHUNKS = Counter("isobot_ingested_chunks_total", "Chunks upserted into the vector store")
+PDF_PAGES = Counter("isobot_pdf_pages_total", "PDF pages parsed")
+
+# Stage timings of the request being handled; spans add to it when it is set
+_timings = ContextVar("timings", default=None)
+
+
+def start_request():
+    """Starts collecting stage timings for the current request (or task) and returns them."""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(stage):
+    """
+    Times a block as `stage`: observed in the stage histogram and, inside a request, added to its
+    timings. Blocking calls sent to a thread pool should be wrapped where they are awaited, since
+    the request's context does not follow them into the pool.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def server_timing(timings):
+    """Server-Timing header value, in milliseconds."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def render():
+    """(body, content type) of the Prometheus exposition for /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
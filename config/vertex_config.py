@@ -1,9 +1,10 @@
-from langchain_google_vertexai import (
-    VertexAI, VertexAIEmbeddings, 
-    VectorSearchVectorStore)
 from dotenv import load_dotenv
-import vertexai
 import os
+# file imports
+from config.lazy import lazy
+from config.local_store import LocalVectorStore, LOCAL_INDEX_DIR
+from config.fakes import HashEmbeddings, FakeLLM
+from config.embedding_cache import CachedEmbeddings, EMBEDDING_CACHE_PATH
 
 load_dotenv()
 # loading env variables
@@ -12,19 +13,46 @@ REGION=os.getenv("REGION")
 INDEX_ID=os.getenv("INDEX_ID")
 ENDPOINT_ID=os.getenv("ENDPOINT_ID")
 BUCKET_NAME=os.getenv("BUCKET_NAME")
+# "vertex" (remote Vector Search) or "local" (in-process index under LOCAL_INDEX_DIR)
+VECTOR_BACKEND=os.getenv("VECTOR_BACKEND", "vertex")
+# "vertex" or "fake" (deterministic offline embedder)
+EMBEDDINGS_BACKEND=os.getenv("EMBEDDINGS_BACKEND", "vertex")
+# "vertex" or "fake" (offline stand-in answering after FAKE_LLM_LATENCY seconds at FAKE_LLM_TOKENS_PER_SEC)
+LLM_BACKEND=os.getenv("LLM_BACKEND", "vertex")
+FAKE_LLM_LATENCY=float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+FAKE_LLM_TOKENS_PER_SEC=float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "50"))
+IVF_NPROBE=int(os.getenv("IVF_NPROBE", "8"))
+# Set EMBEDDING_CACHE=0 to always call the embedding model
+EMBEDDING_CACHE=os.getenv("EMBEDDING_CACHE", "1") == "1"
 
-# Initializing vector store
-embeddings = VertexAIEmbeddings(model_name="text-embedding-005") 
-vector_store =  VectorSearchVectorStore.from_components(
-    project_id=PROJECT_ID,
-    region=REGION,
-    gcs_bucket_name=BUCKET_NAME,
-    index_id=INDEX_ID,
-    endpoint_id=ENDPOINT_ID,
-    embedding=embeddings,
-    batch_size=1000,
-    stream_update=True
-)
+# Clients are built on first use (or by the backend's startup warmup), not at import:
+# the Vertex SDK import and client setup dominate cold start otherwise
+@lazy
+def get_embeddings():
+    if EMBEDDINGS_BACKEND == "fake":
+        embeddings = HashEmbeddings()
+    else:
+        from langchain_google_vertexai import VertexAIEmbeddings
+        embeddings = VertexAIEmbeddings(model_name="text-embedding-005")
+    if EMBEDDING_CACHE:
+        embeddings = CachedEmbeddings(embeddings, path=EMBEDDING_CACHE_PATH)
+    return embeddings
+
+@lazy
+def get_vector_store():
+    if VECTOR_BACKEND == "local":
+        return LocalVectorStore(get_embeddings(), path=LOCAL_INDEX_DIR, nprobe=IVF_NPROBE)
+    from langchain_google_vertexai import VectorSearchVectorStore
+    return VectorSearchVectorStore.from_components(
+        project_id=PROJECT_ID,
+        region=REGION,
+        gcs_bucket_name=BUCKET_NAME,
+        index_id=INDEX_ID,
+        endpoint_id=ENDPOINT_ID,
+        embedding=get_embeddings(),
+        batch_size=1000,
+        stream_update=True
+    )
 
 # Prompt
 instruction = (
@@ -38,4 +66,9 @@ instruction = (
 )
 
 # LLM Model
-llm = VertexAI(model_name="gemini-2.5-flash")
\ No newline at end of file
+@lazy
+def get_llm():
+    if LLM_BACKEND == "fake":
+        return FakeLLM(latency=FAKE_LLM_LATENCY, tokens_per_second=FAKE_LLM_TOKENS_PER_SEC)
+    from langchain_google_vertexai import VertexAI
+    return VertexAI(model_name="gemini-2.5-flash")
@@ -0,0 +1,125 @@
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+# file imports
+from config import db_config
+
+load_dotenv()
+
+# Set WRITE_BEHIND=0 to write every message to Mongo before the request returns
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "1") == "1"
+WRITE_BUFFER_MAX = int(os.getenv("WRITE_BUFFER_MAX", "200"))
+WRITE_BUFFER_INTERVAL = float(os.getenv("WRITE_BUFFER_INTERVAL", "0.25"))
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer for chat messages. `save_message` only appends to memory; a background
+    thread flushes every `interval` seconds, or as soon as `max_pending` messages are waiting,
+    coalescing each thread's messages into one sequence reservation and all buckets into one
+    bulk_write. Reads go through this buffer so a client always sees its own writes, and
+    `close()` (also run at exit) flushes whatever is left.
+    """
+
+    def __init__(self, max_pending=WRITE_BUFFER_MAX, interval=WRITE_BUFFER_INTERVAL, enabled=WRITE_BEHIND):
+        self.max_pending = max_pending
+        self.interval = interval
+        self.enabled = enabled
+        self._pending = OrderedDict()  # thread_id -> (title, [messages]), not yet handed to Mongo
+        self._inflight = {}  # thread_id -> [messages] being written by the current flush
+        self._count = 0
+        self._lock = threading.Lock()
+        # Held for the whole of a flush, and by readers, so a read never sees a message twice or not at all
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        if enabled:
+            self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def save_message(self, thread_id, message, title="None"):
+        """Same contract as db_config.save_message: `title` only applies if the thread is new."""
+        if not self.enabled or self._closed:
+            db_config.save_message(thread_id, message, title=title)
+            return
+        with self._lock:
+            first_title, messages = self._pending.get(thread_id, (title, []))
+            messages.append(message)
+            self._pending[thread_id] = (first_title or title, messages)
+            self._count += 1
+            if self._count >= self.max_pending:
+                self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes out everything buffered so far. Failed batches are put back and retried on the next flush."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, OrderedDict()
+                self._count = 0
+                self._inflight = {thread_id: messages for thread_id, (_, messages) in batch.items()}
+            try:
+                db_config.save_messages(batch)
+            except Exception as e:
+                print("Error flushing buffered messages, will retry\n", e)
+                with self._lock:
+                    # Older messages go back in front of anything buffered meanwhile
+                    for thread_id, (title, messages) in self._pending.items():
+                        old_title, old = batch.get(thread_id, (title, []))
+                        batch[thread_id] = (old_title or title, old + messages)
+                    self._pending = batch
+                    self._count = sum(len(m) for _, m in batch.values())
+                return 0
+            finally:
+                with self._lock:
+                    self._inflight = {}
+            return sum(len(messages) for _, messages in batch.values())
+
+    def _buffered(self, thread_id):
+        with self._lock:
+            return self._inflight.get(thread_id, []) + self._pending.get(thread_id, (None, []))[1]
+
+    def buffered(self, thread_id):
+        """Messages for a thread that are not in Mongo yet, oldest first."""
+        return [{k: v for k, v in m.items() if k != "seq"} for m in self._buffered(thread_id)]
+
+    def get_thread_page(self, thread_id, before=None, limit=db_config.MESSAGES_PAGE_SIZE):
+        """db_config.get_thread_page over stored plus buffered messages; buffered ones come last."""
+        with self._flush_lock:
+            raw = self._buffered(thread_id)
+            if not raw:
+                return db_config.get_thread_page(thread_id, before, limit)
+            buffered = self.buffered(thread_id)
+            # After a failed flush, message_count already covers messages that were reserved but not written
+            reserved = sum(1 for m in raw if "seq" in m)
+            stored = (db_config.thread_message_count(thread_id) or 0) - reserved
+            total = stored + len(buffered)
+            end = total if before is None else max(0, min(before, total))
+            start = 0 if limit is None else max(0, end - limit)
+            messages = db_config.read_messages(thread_id, start, min(end, stored))
+            messages += buffered[max(0, start - stored):max(0, end - stored)]
+        return {"messages": messages, "has_more": start > 0, "next_before": start if start > 0 else None}
+
+    def get_thread_messages(self, thread_id):
+        return self.get_thread_page(thread_id, limit=None)["messages"]
+
+    def close(self):
+        """Stops the flusher and writes out everything still buffered."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=max(self.interval * 4, 5))
+        self.flush()
@@ -0,0 +1,175 @@
+import json
+import math
+import os
+import re
+import numpy as np
+from collections import Counter
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+load_dotenv()
+
+BM25_INDEX_DIR = os.getenv(
+    "BM25_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "bm25_index"),
+)
+
+TOKEN_RE = re.compile(r"\w+")
+
+VOCAB_FILE = "vocab.json"
+CODE_ROWS_FILE = "code_rows.json"
+CHUNKS_FILE = "chunks.jsonl"
+ARRAY_FILES = ("term_ptr", "post_docs", "post_tf", "doc_len", "chunk_offsets")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over ISO chunks. Postings are stored CSR-style: term_ptr[t]:term_ptr[t+1] slices
+    post_docs/post_tf for term t. The arrays are memory-mapped on load and chunk texts are read
+    from the sidecar by byte offset, so startup cost is independent of corpus size.
+    """
+
+    def __init__(self, path=BM25_INDEX_DIR, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(path, VOCAB_FILE), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        for name in ARRAY_FILES:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        self.num_docs = len(self.doc_len)
+        self.avg_len = float(np.mean(self.doc_len)) if self.num_docs else 0.0
+        self._chunks_fd = os.open(os.path.join(path, CHUNKS_FILE), os.O_RDONLY)
+        self.code_rows = {}
+        if os.path.exists(os.path.join(path, CODE_ROWS_FILE)):
+            with open(os.path.join(path, CODE_ROWS_FILE), "r", encoding="utf-8") as f:
+                self.code_rows = json.load(f)
+
+    @staticmethod
+    def build(chunks, path=BM25_INDEX_DIR, ids=None, shared_codes=None):
+        """
+        Builds and saves an index over `chunks` (LangChain Documents), e.g. the output of embed_docs.split_text.
+        `shared_codes` ({chunk id: [codes]}, see Deduper.shared_codes) adds the standards a chunk was merged from.
+        """
+        shared_codes = shared_codes or {}
+        os.makedirs(path, exist_ok=True)
+        vocab = {}
+        postings = []
+        doc_len = np.zeros(len(chunks), dtype=np.int32)
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        code_rows = {}
+
+        with open(os.path.join(path, CHUNKS_FILE), "wb") as f:
+            for row, chunk in enumerate(chunks):
+                tokens = tokenize(chunk.page_content)
+                doc_len[row] = len(tokens)
+                for term, tf in Counter(tokens).items():
+                    term_id = vocab.setdefault(term, len(vocab))
+                    if term_id == len(postings):
+                        postings.append([])
+                    postings[term_id].append((row, tf))
+                chunk_id = ids[row] if ids else chunk.id
+                codes = chunk.metadata.get("codes") or [chunk.metadata.get("code", "")]
+                for code in dict.fromkeys(codes + shared_codes.get(chunk_id, [])):
+                    code_rows.setdefault(code, []).append(row)
+                offsets[row] = f.tell()
+                line = json.dumps({"id": chunk_id, "text": chunk.page_content, "metadata": chunk.metadata},
+                                  ensure_ascii=False)
+                f.write(line.encode("utf-8") + b"\n")
+            offsets[len(chunks)] = f.tell()
+
+        term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        term_ptr[1:] = np.cumsum([len(p) for p in postings])
+        post_docs = np.empty(term_ptr[-1], dtype=np.int32)
+        post_tf = np.empty(term_ptr[-1], dtype=np.float32)
+        for term_id, plist in enumerate(postings):
+            start = term_ptr[term_id]
+            post_docs[start:start + len(plist)] = [d for d, _ in plist]
+            post_tf[start:start + len(plist)] = [tf for _, tf in plist]
+
+        with open(os.path.join(path, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        with open(os.path.join(path, CODE_ROWS_FILE), "w", encoding="utf-8") as f:
+            json.dump(code_rows, f, ensure_ascii=False)
+        arrays = {"term_ptr": term_ptr, "post_docs": post_docs, "post_tf": post_tf,
+                  "doc_len": doc_len, "chunk_offsets": offsets}
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        print(f"Built BM25 index: {len(chunks)} chunks, {len(vocab)} terms, {len(post_docs)} postings.")
+
+    def scores(self, query):
+        """Returns a BM25 score per chunk row for `query`."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            docs = self.post_docs[start:end]
+            tf = self.post_tf[start:end]
+            idf = math.log(1 + (self.num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avg_len)
+            # Each chunk appears once per term's postings, so plain fancy-index add is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def rows_for_codes(self, codes):
+        """Chunk rows belonging to any of `codes`, from the code index precomputed at build time."""
+        rows = [row for code in codes for row in self.code_rows.get(code, [])]
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def search(self, query, k=5, allowed_rows=None):
+        """Returns [(row, score)] for the top-k chunks with a positive score."""
+        if not self.num_docs:
+            return []
+        scores = self.scores(query)
+        rows = np.arange(self.num_docs) if allowed_rows is None else np.asarray(allowed_rows)
+        if not len(rows):
+            return []
+        candidate = scores[rows]
+        k = min(k, len(rows))
+        top = np.argpartition(-candidate, k - 1)[:k]
+        top = top[np.argsort(-candidate[top])]
+        return [(int(rows[i]), float(candidate[i])) for i in top if candidate[i] > 0]
+
+    def get_chunk(self, row):
+        # pread keeps concurrent lookups from different threads independent
+        start, end = int(self.chunk_offsets[row]), int(self.chunk_offsets[row + 1])
+        chunk = json.loads(os.pread(self._chunks_fd, end - start, start))
+        return Document(page_content=chunk["text"], metadata=chunk["metadata"], id=chunk["id"])
+
+    def similarity_search(self, query, k=5, allowed_rows=None):
+        return [self.get_chunk(row) for row, _ in self.search(query, k, allowed_rows)]
+
+
+def load_index(path=BM25_INDEX_DIR):
+    """Returns the index at `path`, or None if it has not been built yet."""
+    if not os.path.exists(os.path.join(path, VOCAB_FILE)):
+        return None
+    return BM25Index(path)
+
+
+if __name__ == "__main__":
+    import argparse
+    from src.embed_docs import load_documents, split_text, chunk_id, data_path
+    from src.dedup import Deduper
+
+    parser = argparse.ArgumentParser(description="Build the BM25 index over the ISO corpus")
+    parser.add_argument("--data", default=data_path)
+    parser.add_argument("--path", default=BM25_INDEX_DIR)
+    parser.add_argument("--no-dedup", action="store_true", help="index near-duplicate chunks separately")
+    args = parser.parse_args()
+
+    chunks = split_text(load_documents(set(), path=args.data))
+    shared_codes = None
+    if not args.no_dedup:
+        # Same canonical chunks (and ids) as the vector store, so hybrid fusion lines up
+        deduper = Deduper(path=":memory:")
+        chunks = deduper.filter(chunks, [chunk_id(c) for c in chunks])
+        shared_codes = deduper.shared_codes()
+        print(f"Dedup: {deduper.stats()}")
+    BM25Index.build(chunks, path=args.path, ids=[chunk_id(c) for c in chunks], shared_codes=shared_codes)
@@ -0,0 +1,189 @@
+import re
+from langchain_core.documents import Document
+
+MAX_CHUNK_CHARS = 1500
+MIN_SECTION_CHARS = 40
+
+# "6.4.2 Title" on one line, or "6.4.2" alone with the title on the next line (crawled HTML puts labels on their own line)
+NUMBERED_HEADING_RE = re.compile(r"^((?:\d{1,2}|[A-Z])(?:\.\d{1,2}){0,5})(?:\s+(\S.{0,119}))?$")
+ANNEX_RE = re.compile(r"^Annex\s+([A-Z])\b\s*(.{0,120})$")
+ANNEX_KIND_RE = re.compile(r"^\((?:normative|informative)\)$", re.IGNORECASE)
+NAMED_SECTIONS = {
+    "foreword": "Foreword",
+    "introduction": "Introduction",
+    "scope": "Scope",
+    "normative references": "Normative references",
+    "terms and definitions": "Terms and definitions",
+    "terms, definitions and abbreviated terms": "Terms and definitions",
+    "bibliography": "Bibliography",
+}
+SENTENCE_END_RE = re.compile(r"(?<=[.;:])\s+")
+
+
+def clause_key(clause):
+    """Sort key for clause numbers; annex clauses ("A.2") sort after numbered ones."""
+    parts = clause.split(".")
+    head = parts[0]
+    first = (1, ord(head)) if head.isalpha() else (0, int(head))
+    return (first, *[int(p) for p in parts[1:]])
+
+
+def section_label(clause, title):
+    if title and title.startswith("Annex"):
+        return title
+    return " ".join(p for p in (clause, title) if p)
+
+
+def is_title(text):
+    return bool(text) and len(text) <= 120 and (text[0].isupper() or text[0] in "(\"“") and not text.endswith(".")
+
+
+class ClauseSplitter:
+    """
+    Single-pass splitter for ISO standard text. It recognises clause numbering ("6.4.2"), annexes and
+    named sections (Foreword, Scope, Terms and definitions, ...) and emits one chunk per clause.
+    Clauses longer than `max_chars` are cut on paragraph boundaries into parts, and clauses with
+    less than `min_chars` of text (bare headings) are merged into the clause that follows.
+    Chunks carry `clause`, `clause_title`, `part` and `start_index` metadata.
+    """
+
+    def __init__(self, max_chars=MAX_CHUNK_CHARS, min_chars=MIN_SECTION_CHARS):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+
+    def _heading(self, lines, i, last_clause):
+        """Returns (clause, title, lines_consumed) if lines[i] starts a section, else None."""
+        line = lines[i].strip()
+        following = [l.strip() for l in lines[i + 1:i + 3]] + ["", ""]
+        named = NAMED_SECTIONS.get(line.lower())
+        if named:
+            return None, named, 1
+        match = ANNEX_RE.match(line)
+        if match:
+            title, consumed = match.group(2).strip(), 1
+            if not title and ANNEX_KIND_RE.match(following[0]):
+                title, consumed = following[0], 2
+            if is_title(following[consumed - 1]) and (not title or consumed == 2):
+                title, consumed = f"{title} {following[consumed - 1]}".strip(), consumed + 1
+            return match.group(1), f"Annex {match.group(1)} {title}".strip(), consumed
+        match = NUMBERED_HEADING_RE.match(line)
+        if not match or match.group(1).isalpha():
+            return None  # a lone capital letter is only an annex via "Annex X"
+        clause, title = match.group(1), match.group(2)
+        consumed = 1
+        if title is None:
+            if not is_title(following[0]):
+                return None
+            title, consumed = following[0], 2
+        elif not is_title(title):
+            return None
+        # Clause numbers only move forward; anything else is a table cell, list item or page number
+        if last_clause is not None and clause_key(clause) <= clause_key(last_clause):
+            return None
+        return clause, NAMED_SECTIONS.get(title.lower(), title), consumed
+
+    def _sections(self, text, clause=None, title=None):
+        """Yields (clause, title, start_index, body_lines) for each section of `text`; bodies may be empty."""
+        lines = text.split("\n")
+        offsets = []
+        pos = 0
+        for line in lines:
+            offsets.append(pos)
+            pos += len(line) + 1
+
+        # Named sections (Foreword, Bibliography) have no number but must not reset the ordering check
+        last_clause = clause
+        start, body = 0, []
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            heading = self._heading(lines, i, last_clause) if line else None
+            if heading:
+                if body or i:
+                    yield clause, title, start, body
+                clause, title, consumed = heading
+                last_clause = clause or last_clause
+                start, body = offsets[i], []
+                i += consumed
+                continue
+            if line:
+                body.append(line)
+            i += 1
+        if body or title:
+            yield clause, title, start, body
+
+    def _parts(self, body):
+        """Groups paragraph lines into parts of at most max_chars, cutting over-long lines at sentence ends."""
+        pieces = []
+        for line in body:
+            while len(line) > self.max_chars:
+                cut = max((m.start() for m in SENTENCE_END_RE.finditer(line, 0, self.max_chars)), default=self.max_chars)
+                pieces.append(line[:cut].strip())
+                line = line[cut:].strip()
+            if line:
+                pieces.append(line)
+        parts, current = [], ""
+        for piece in pieces:
+            # A short lead-in (a folded heading) stays with the paragraph after it even if that overshoots
+            if current and len(current) + 1 + len(piece) > self.max_chars and len(current) >= self.min_chars:
+                parts.append(current)
+                current = piece
+            else:
+                current = f"{current}\n{piece}" if current else piece
+        if current:
+            parts.append(current)
+        return parts
+
+    def _chunk(self, text, metadata, clause, title, part, parts, start):
+        label = section_label(clause, title)
+        if parts > 1:
+            label += f" (part {part}/{parts})"
+        header = " — ".join(p for p in (metadata.get("code", ""), label) if p)
+        chunk_meta = dict(metadata)
+        chunk_meta.update({"clause": clause or "", "clause_title": title or "", "part": part, "start_index": start})
+        return Document(page_content=f"{header}\n{text}" if header else text, metadata=chunk_meta)
+
+    def split_text(self, text, metadata=None, clause=None, title=None):
+        """Splits one document's text into clause chunks. `clause`/`title` continue a section from a previous page."""
+        metadata = metadata or {}
+        chunks = []
+        carry, carry_section = [], None
+        for clause, title, start, body in self._sections(text, clause, title):
+            # A heading with (almost) no text of its own, e.g. "6 Planning", is folded into the next clause
+            if sum(len(line) for line in body) < self.min_chars:
+                heading = section_label(clause, title)
+                carry += ([heading] if heading else []) + body
+                carry_section = carry_section or (clause, title, start)
+                continue
+            if carry:
+                body = carry + body
+                start = carry_section[2]
+                carry = []
+            carry_section = None
+            parts = self._parts(body)
+            for n, part in enumerate(parts, 1):
+                chunks.append(self._chunk(part, metadata, clause, title, n, len(parts), start))
+        if carry:
+            clause, title, start = carry_section
+            if carry[0] == section_label(clause, title):
+                carry = carry[1:] or carry  # the chunk header already names the section
+            chunks.append(self._chunk("\n".join(carry), metadata, clause, title, 1, 1, start))
+        return chunks
+
+    def iter_split(self, documents):
+        """
+        Streams chunks for documents in order. Consecutive documents from the same source (e.g. PDF
+        pages) continue the clause that was open at the end of the previous one.
+        """
+        open_clause = {}
+        for doc in documents:
+            source = doc.metadata.get("source") or doc.metadata.get("code")
+            clause, title = open_clause.get(source, (None, None))
+            doc_chunks = self.split_text(doc.page_content, doc.metadata, clause, title)
+            if doc_chunks:
+                last = doc_chunks[-1].metadata
+                open_clause[source] = (last["clause"] or None, last["clause_title"] or None)
+            yield from doc_chunks
+
+    def split_documents(self, documents):
+        return list(self.iter_split(documents))
@@ -0,0 +1,176 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+# file imports
+from config.vertex_config import get_vector_store
+from config.local_store import LocalVectorStore
+from src.prompt_builder import estimate_tokens
+
+load_dotenv()
+
+# Tokens the retrieved context may take up in the prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Candidates fetched before MMR selection, as a multiple of k
+MMR_FETCH_FACTOR = int(os.getenv("MMR_FETCH_FACTOR", "4"))
+# 1.0 ranks by relevance only, lower values favour chunks unlike those already selected
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+# Packed chunks cut to fit the budget keep at least this many tokens, otherwise they are dropped
+MIN_PARTIAL_TOKENS = 100
+# Longest text overlap looked for when joining chunks split with overlap
+MAX_OVERLAP_CHARS = 400
+
+
+def candidate_vectors(docs):
+    """
+    Stored vectors of retrieved chunks, or None if the vector store cannot return all of them. Only the
+    local store keeps them; re-embedding the candidates would cost a model call per question.
+    """
+    vector_store = get_vector_store()
+    if not isinstance(vector_store, LocalVectorStore):
+        return None
+    vectors = vector_store.get_vectors([doc.id for doc in docs])
+    if any(v is None for v in vectors):
+        return None
+    matrix = np.asarray(vectors, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def mmr(query_vector, vectors, k, lambda_=MMR_LAMBDA):
+    """Maximal marginal relevance: indices of k rows balancing similarity to the query against redundancy."""
+    if not len(vectors):
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    relevance = vectors @ query
+    selected = [int(np.argmax(relevance))]
+    redundancy = vectors @ vectors[selected[0]]
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return selected
+
+
+def mmr_rerank(query_vector, docs):
+    """
+    All candidates in MMR order, so later preferences can still promote any of them. `query_vector` is
+    the one the search used; without stored vectors for every candidate, the search order is kept.
+    """
+    vectors = candidate_vectors(docs) if len(docs) > 1 else None
+    if vectors is None:
+        return docs
+    order = mmr(query_vector, vectors, len(docs))
+    return [docs[i] for i in order]
+
+
+def source_key(doc):
+    return doc.metadata.get("code") or doc.metadata.get("source"), doc.metadata.get("page")
+
+
+def split_header(doc):
+    """(header, body) for clause chunks, whose first line names the code and clause; ("", text) otherwise."""
+    if doc.metadata.get("clause_title") or doc.metadata.get("clause"):
+        header, _, body = doc.page_content.partition("\n")
+        return header, body
+    return "", doc.page_content
+
+
+def overlap(a, b):
+    """Length of the longest suffix of `a` that is a prefix of `b`, up to MAX_OVERLAP_CHARS."""
+    for n in range(min(len(a), len(b), MAX_OVERLAP_CHARS), 0, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def adjacent(a, b):
+    """True if chunk b continues chunk a: the next part of the same clause, or text that touches or overlaps a."""
+    if a.metadata.get("clause_title") or a.metadata.get("clause"):
+        return (a.metadata.get("clause") == b.metadata.get("clause")
+                and a.metadata.get("clause_title") == b.metadata.get("clause_title")
+                and b.metadata.get("part", 1) == a.metadata.get("part", 1) + 1)
+    a_start, b_start = a.metadata.get("start_index"), b.metadata.get("start_index")
+    if a_start is None or b_start is None:
+        return False
+    return a_start <= b_start <= a_start + len(a.page_content)
+
+
+def merge_adjacent(docs):
+    """
+    Joins chunks of the same standard (or PDF page) that continue each other, in start_index order,
+    so shared headers and split overlaps are sent once. Groups keep the rank of their best chunk.
+    """
+    groups = []
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        by_source.setdefault(source_key(doc), []).append((rank, doc))
+    for members in by_source.values():
+        members.sort(key=lambda m: (m[1].metadata.get("start_index") or 0, m[1].metadata.get("part", 1)))
+        current = [members[0]]
+        for member in members[1:]:
+            if adjacent(current[-1][1], member[1]):
+                current.append(member)
+            else:
+                groups.append(current)
+                current = [member]
+        groups.append(current)
+
+    merged = []
+    for group in sorted(groups, key=lambda g: min(rank for rank, _ in g)):
+        docs_in_group = [doc for _, doc in group]
+        if len(docs_in_group) == 1:
+            merged.append(docs_in_group[0])
+            continue
+        header, text = split_header(docs_in_group[0])
+        for doc in docs_in_group[1:]:
+            body = split_header(doc)[1]
+            shared = overlap(text, body)
+            text += ("\n" if header or not shared else "") + body[shared:]
+        metadata = dict(docs_in_group[0].metadata, merged_parts=len(docs_in_group))
+        merged.append(Document(page_content=f"{header}\n{text}" if header else text, metadata=metadata,
+                               id="+".join(doc.id or "" for doc in docs_in_group)))
+    return merged
+
+
+def truncate_to_tokens(text, tokens):
+    """Cuts text to about `tokens` tokens, at the last line break that fits."""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut if cut > 0 else limit]
+
+
+def pack(docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Keeps docs in rank order while they fit the budget; the first one that does not is cut down if worthwhile."""
+    packed, used = [], 0
+    for doc in docs:
+        tokens = estimate_tokens(doc.page_content)
+        if used + tokens <= token_budget:
+            packed.append(doc)
+            used += tokens
+            continue
+        remaining = token_budget - used
+        if remaining >= MIN_PARTIAL_TOKENS:
+            text = truncate_to_tokens(doc.page_content, remaining)
+            packed.append(Document(page_content=text, metadata=dict(doc.metadata, truncated=True), id=doc.id))
+        break
+    return packed
+
+
+def pack_context(docs, raw_docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Merges and packs the selected chunks. Returns (docs, report); the report compares the packed
+    context with plain concatenation of `raw_docs`, the top-k chunks without MMR, merging or a budget.
+    """
+    merged = merge_adjacent(docs)
+    packed = pack(merged, token_budget)
+    raw_tokens = sum(estimate_tokens(doc.page_content) for doc in raw_docs)
+    packed_tokens = sum(estimate_tokens(doc.page_content) for doc in packed)
+    report = {"selected": len(docs), "merged": len(docs) - len(merged), "packed": len(packed),
+              "raw_tokens": raw_tokens, "packed_tokens": packed_tokens,
+              "tokens_saved": max(raw_tokens - packed_tokens, 0)}
+    return packed, report
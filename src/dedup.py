@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import zlib
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+load_dotenv()
+
+DEDUP_INDEX_PATH = os.getenv(
+    "DEDUP_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "dedup_index.sqlite"),
+)
+# Estimated Jaccard similarity (over word shingles) above which two chunks count as the same text
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity share a bucket with high probability
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+MERSENNE_PRIME = (1 << 61) - 1
+WORD_RE = re.compile(r"\w+")
+
+_rng = np.random.RandomState(1)
+PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+
+
+def chunk_body(chunk):
+    """Chunk text without its standard's code, so copies of the same boilerplate match across standards."""
+    code = chunk.metadata.get("code", "")
+    return chunk.page_content.replace(code, " ") if code else chunk.page_content
+
+
+def minhash(text):
+    """MinHash signature (NUM_PERM uint64 values) of the text's word 5-gram shingles."""
+    words = WORD_RE.findall(text.lower())
+    grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))]
+    shingles = np.fromiter({zlib.crc32(g.encode("utf-8")) for g in grams}, dtype=np.uint64)
+    # a * x + b stays below 2**63 for 31-bit a, b and 32-bit x, so uint64 arithmetic does not wrap
+    hashes = (np.outer(PERM_A, shingles) + PERM_B[:, None]) % MERSENNE_PRIME
+    return hashes.min(axis=1)
+
+
+def band_keys(signature):
+    return [hashlib.blake2b(signature[b * ROWS:(b + 1) * ROWS].tobytes(), digest_size=8).hexdigest()
+            for b in range(BANDS)]
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity: the fraction of equal signature positions."""
+    return float(np.mean(a == b))
+
+
+class Deduper:
+    """
+    Near-duplicate filter for chunks, using MinHash signatures and LSH banding. The first chunk
+    seen for a text is canonical; later near-copies are dropped and their codes are recorded against
+    the canonical chunk in the `chunk_codes` table (see shared_codes), so a canonical chunk is stored
+    once and never upserted again however many standards share it. Canonical chunks and band buckets
+    are kept in SQLite too, so later ingestion runs dedup against everything stored before.
+    Use path=":memory:" for one-off runs.
+    """
+
+    def __init__(self, path=DEDUP_INDEX_PATH, threshold=DEDUP_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.stats_counts = {"chunks": 0, "duplicates": 0, "chars_saved": 0}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, signature BLOB NOT NULL, "
+                           "text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, bucket TEXT, id TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunk_codes (code TEXT NOT NULL, id TEXT NOT NULL, "
+                           "PRIMARY KEY (code, id))")
+        self._conn.commit()
+
+    def _canonical_match(self, signature, keys):
+        """Id of the most similar stored chunk at or above the threshold, or None."""
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(row[0] for row in self._conn.execute(
+                "SELECT id FROM bands WHERE band = ? AND bucket = ?", (band, key)))
+        best, best_score = None, self.threshold
+        for chunk_id in candidates:
+            blob = self._conn.execute("SELECT signature FROM chunks WHERE id = ?", (chunk_id,)).fetchone()[0]
+            score = similarity(signature, np.frombuffer(blob, dtype=np.uint64))
+            if score >= best_score:
+                best, best_score = chunk_id, score
+        return best
+
+    def _load(self, chunk_id):
+        text, metadata = self._conn.execute("SELECT text, metadata FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+        return Document(page_content=text, metadata=json.loads(metadata), id=chunk_id)
+
+    def filter(self, chunks, ids, signatures=None):
+        """
+        Returns the chunks to store: the new canonical chunks of this batch. Near-copies only add their
+        code to `chunk_codes`. `ids` are the chunks' store ids and `signatures` may be precomputed (see minhash).
+        """
+        signatures = signatures or [minhash(chunk_body(c)) for c in chunks]
+        pending = {}
+        for chunk, chunk_id, signature in zip(chunks, ids, signatures):
+            self.stats_counts["chunks"] += 1
+            code = chunk.metadata.get("code", "")
+            keys = band_keys(signature)
+            canonical_id = self._canonical_match(signature, keys)
+            if canonical_id is None:
+                self._conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                                   (chunk_id, signature.tobytes(), chunk.page_content, json.dumps(chunk.metadata)))
+                self._conn.executemany("INSERT INTO bands VALUES (?, ?, ?)",
+                                       [(band, key, chunk_id) for band, key in enumerate(keys)])
+                pending[chunk_id] = chunk
+                continue
+            if canonical_id == chunk_id:
+                canonical = pending.get(chunk_id) or self._load(chunk_id)
+                if canonical.metadata.get("code", "") == code:
+                    # The stored canonical chunk itself (e.g. a batch retried after a crash): store it again
+                    pending[chunk_id] = canonical
+                    continue
+            self.stats_counts["duplicates"] += 1
+            self.stats_counts["chars_saved"] += len(chunk.page_content)
+            self._conn.execute("INSERT OR IGNORE INTO chunk_codes VALUES (?, ?)", (code, canonical_id))
+        self._conn.commit()
+        return list(pending.values())
+
+    def shared_codes(self):
+        """{canonical chunk id: [codes]} of the other standards whose near-copies were merged into each chunk."""
+        shared = {}
+        for code, chunk_id in self._conn.execute("SELECT code, id FROM chunk_codes ORDER BY id, code"):
+            shared.setdefault(chunk_id, []).append(code)
+        return shared
+
+    def stats(self, embedding_dim=None):
+        """Chunks seen and dropped by this deduper, with the embedding characters and (given the dim) index bytes saved."""
+        stats = dict(self.stats_counts)
+        stats["duplicate_rate"] = stats["duplicates"] / stats["chunks"] if stats["chunks"] else 0.0
+        if embedding_dim:
+            stats["index_bytes_saved"] = stats["duplicates"] * embedding_dim * 4
+        return stats
+
+
+def load_shared_codes(path=DEDUP_INDEX_PATH):
+    """Deduper.shared_codes() of the index at `path`, or {} if nothing has been deduplicated there yet."""
+    if not os.path.exists(path):
+        return {}
+    return Deduper(path).shared_codes()
@@ -1,9 +1,19 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from itertools import islice
+import argparse
+import hashlib
 import json
+import os
+import time
 
 # file import
-from config.vertex_config import vector_store
+from config.vertex_config import get_vector_store, get_embeddings
+from config.answer_cache import bump_store_version
+from config.metrics import span, INGESTED_CHUNKS
+from src.chunker import ClauseSplitter, MAX_CHUNK_CHARS
+from src.dedup import Deduper, minhash, chunk_body
 
 data_path = "../data/iso_docs.jsonl"
 PROCESSED_LOG_PATH = "../data/processed_codes.txt"
@@ -18,63 +28,143 @@ def load_processed_codes(log_path=PROCESSED_LOG_PATH):
         pass
     return processed_codes
 
-def save_processed_codes(processed_codes, log_path=PROCESSED_LOG_PATH):
-    with open(log_path, "w", encoding="utf-8") as f:
-        for code in processed_codes:
-            f.write(f"{code}\n")
+def append_processed_codes(codes, journal):
+    """Appends codes to the open journal and forces them to disk, so a crash never loses finished batches."""
+    for code in codes:
+        journal.write(f"{code}\n")
+    journal.flush()
+    os.fsync(journal.fileno())
 
 def main():
-    already_processed = load_processed_codes()
-    new_documents = load_documents(already_processed)
-    if not new_documents:
-        print("No new documents to embed.")
-        return
-    chunks = split_text(new_documents)
-    embed_to_vectorstore(chunks)
-    # Save newly processed codes
-    all_processed = already_processed | set(doc.metadata["code"] for doc in new_documents)
-    save_processed_codes(all_processed)
-
-def load_documents(already_processed):
-    docs = []
-    with open(data_path, "r", encoding="utf-8") as f:
+    parser = argparse.ArgumentParser(description="Embed iso_docs.jsonl into the vector store")
+    parser.add_argument("--doc-batch", type=int, default=100, help="documents per chunking/upsert unit")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="chunking processes")
+    parser.add_argument("--max-inflight", type=int, default=4, help="concurrent embedding/upsert batches")
+    parser.add_argument("--no-dedup", action="store_true", help="embed near-duplicate chunks instead of merging them")
+    args = parser.parse_args()
+    run_pipeline(doc_batch=args.doc_batch, workers=args.workers, max_inflight=args.max_inflight,
+                 dedup=not args.no_dedup)
+
+def iter_documents(already_processed, path=data_path):
+    """Streams documents from the JSONL corpus, skipping codes that are already embedded."""
+    with open(path, "r", encoding="utf-8") as f:
         for line in f:
             entry = json.loads(line)
             code = entry.get("code", "")
             if code in already_processed:
                 continue  # Skip duplicates
-            docs.append(Document(
-                page_content=f"{code} {entry['text']}",
+            # The chunker puts the code in each chunk's header, so the text is kept as crawled
+            yield Document(
+                page_content=entry['text'],
                 metadata={"code": code}
-            ))
-    return docs
-
-def split_text(documents: list[Document], chunk_size=1000, chunk_overlap=120):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        add_start_index=True,
-    )
-    chunks = []
-    for doc in documents:
-        doc_chunks = text_splitter.split_documents([doc]) 
-        for chunk in doc_chunks:
-            code = doc.metadata.get("code", "")
-            chunk.page_content = f"{code} {chunk.page_content}"
-            chunks.append(chunk)
-    print(f"Split {len(documents)} documents into {len(chunks)} chunks.")
+            )
+
+def load_documents(already_processed, path=data_path):
+    return list(iter_documents(already_processed, path))
+
+def iter_batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def split_text(documents: list[Document], max_chars=MAX_CHUNK_CHARS, verbose=True):
+    """Splits each standard into clause chunks headed by "<code> — <clause> <title>" (see src/chunker)."""
+    chunks = ClauseSplitter(max_chars=max_chars).split_documents(documents)
+    if verbose:
+        print(f"Split {len(documents)} documents into {len(chunks)} chunks.")
     return chunks
 
-def embed_to_vectorstore(chunks: list[Document], batch_size=1000):
-    try:
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
-            vector_store.add_documents(batch)
-            print(f"Added {len(batch)} chunks ({i+1}-{i+len(batch)})")
-        print(f"Total: {len(chunks)} ISO clause chunks added.")
-    except Exception as e:
-        print("Error Adding Documents to Vector Store\n", e)
+def chunk_batch(documents: list[Document], signatures=False):
+    """Process-pool entry point: splits one batch of documents, optionally with each chunk's MinHash signature."""
+    chunks = split_text(documents, verbose=False)
+    if not signatures:
+        return chunks, None
+    return chunks, [minhash(chunk_body(c)) for c in chunks]
+
+def chunk_id(chunk: Document):
+    """Stable id from chunk content, shared by the vector store and the BM25 index so results can be fused."""
+    return hashlib.sha1(chunk.page_content.encode("utf-8")).hexdigest()
+
+def upsert_batch(chunks: list[Document], batch_size=1000):
+    """Embeds and upserts one unit of work; errors propagate to the pipeline."""
+    for i in range(0, len(chunks), batch_size):
+        batch = chunks[i:i + batch_size]
+        with span("ingest_batch"):
+            get_vector_store().add_documents(batch, ids=[chunk_id(c) for c in batch])
+        INGESTED_CHUNKS.inc(len(batch))
+    return len(chunks)
+
+def run_pipeline(doc_batch=100, workers=None, max_inflight=4, path=data_path, log_path=PROCESSED_LOG_PATH,
+                 dedup=True):
+    """
+    Streaming ingestion: documents are read lazily, split in a process pool and upserted by at most
+    `max_inflight` concurrent batches. Reading stalls while that many batches are pending (backpressure),
+    and each batch's codes are journaled as soon as it is stored, so a rerun resumes where a crash stopped.
+    With `dedup`, near-duplicate chunks (shared boilerplate) are merged into one canonical chunk before embedding.
+    """
+    workers = workers or os.cpu_count()
+    already_processed = load_processed_codes(log_path)
+    deduper = Deduper() if dedup else None
+    stats = {"docs": 0, "chunks": 0, "failed_batches": 0}
+    start = time.perf_counter()
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        label = "Total" if final else "Progress"
+        print(f"{label}: {stats['docs']} docs, {stats['chunks']} chunks in {elapsed:.1f}s "
+              f"({stats['docs'] / elapsed:.1f} docs/s, {stats['chunks'] / elapsed:.1f} chunks/s)"
+              + (f", {stats['failed_batches']} failed batches" if stats["failed_batches"] else ""))
+
+    with open(log_path, "a", encoding="utf-8") as journal, \
+            ProcessPoolExecutor(max_workers=workers) as chunk_pool, \
+            ThreadPoolExecutor(max_workers=max_inflight) as upsert_pool:
+        chunking = deque()
+        upserts = {}
+
+        def finish(done):
+            for future in done:
+                codes = upserts.pop(future)
+                try:
+                    stats["chunks"] += future.result()
+                    stats["docs"] += len(codes)
+                    append_processed_codes(codes, journal)
+                except Exception as e:
+                    stats["failed_batches"] += 1
+                    print("Error Adding Documents to Vector Store\n", e)
+            report()
+
+        def submit_upsert():
+            codes, future = chunking.popleft()
+            chunks, signatures = future.result()
+            if deduper:
+                chunks = deduper.filter(chunks, [chunk_id(c) for c in chunks], signatures)
+            while len(upserts) >= max_inflight:
+                done, _ = wait(upserts, return_when=FIRST_COMPLETED)
+                finish(done)
+            upserts[upsert_pool.submit(upsert_batch, chunks)] = codes
+
+        for docs in iter_batches(iter_documents(already_processed, path), doc_batch):
+            codes = [doc.metadata["code"] for doc in docs]
+            chunking.append((codes, chunk_pool.submit(chunk_batch, docs, dedup)))
+            # Bound the chunked-but-not-stored backlog so memory stays flat on large corpora
+            if len(chunking) >= workers * 2:
+                submit_upsert()
+        while chunking:
+            submit_upsert()
+        if upserts:
+            finish(wait(upserts).done)
+
+    if stats["docs"] == 0 and stats["failed_batches"] == 0:
+        print("No new documents to embed.")
+        return stats
+    report(final=True)
+    if stats["chunks"]:
+        bump_store_version()
+    if deduper:
+        print(f"Dedup: {deduper.stats(embedding_dim=getattr(get_vector_store(), 'dim', None))}")
+    if hasattr(get_embeddings(), "stats"):
+        print(f"Embedding cache: {get_embeddings().stats()}")
+    return stats
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_KEEP_TURNS = int(os.getenv("PROMPT_KEEP_TURNS", "4"))
+SUMMARY_CACHE_THREADS = int(os.getenv("SUMMARY_CACHE_THREADS", "1000"))
+
+SUMMARY_INSTRUCTION = (
+    "Update the running summary of a compliance conversation with the new turns below. "
+    "Keep every ISO standard, clause and decision that was mentioned, drop greetings and filler, "
+    "and answer with the updated summary only, in at most 200 words."
+)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token), close enough for budgeting without a tokenizer call."""
+    return (len(text) + 3) // 4
+
+
+def message_line(m):
+    role = "User" if m.type == "human" else "Bot"
+    return f"{role}: {m.content}"
+
+
+class PromptBuilder:
+    """
+    Assembles the RAG prompt within a token budget. The last `keep_turns` turns are kept verbatim
+    and older ones are folded into a per-thread running summary, which is only extended when
+    more turns fall out of the window. `get_llm` returns the model that writes the summaries.
+    """
+
+    def __init__(self, instruction, get_llm, token_budget=PROMPT_TOKEN_BUDGET, keep_turns=PROMPT_KEEP_TURNS,
+                 max_threads=SUMMARY_CACHE_THREADS):
+        self.instruction = instruction
+        self.get_llm = get_llm
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.max_threads = max_threads
+        # thread_id -> (number of messages folded, summary text)
+        self._summaries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached_summary(self, thread_id):
+        with self._lock:
+            if thread_id in self._summaries:
+                self._summaries.move_to_end(thread_id)
+                return self._summaries[thread_id]
+        return 0, ""
+
+    def _store_summary(self, thread_id, folded, summary):
+        with self._lock:
+            self._summaries[thread_id] = (folded, summary)
+            self._summaries.move_to_end(thread_id)
+            while len(self._summaries) > self.max_threads:
+                self._summaries.popitem(last=False)
+
+    def _plan(self, thread_id, history, context, user_input):
+        """Picks the verbatim window and returns (window, previous summary, messages still to fold)."""
+        folded, summary = self._cached_summary(thread_id)
+        if folded > len(history):
+            # The thread was rewound or replaced; start the summary again
+            folded, summary = 0, ""
+        fixed = estimate_tokens(self.instruction) + estimate_tokens(context) + estimate_tokens(user_input)
+        # Messages already in the summary are never repeated verbatim
+        window = min(len(history) - folded, self.keep_turns * 2)
+        # Shrink the verbatim window while the estimate is over budget
+        while window > 0:
+            recent = sum(estimate_tokens(message_line(m)) for m in history[len(history) - window:])
+            if fixed + estimate_tokens(summary) + recent <= self.token_budget:
+                break
+            window -= 1
+        older = history[:len(history) - window]
+        return window, summary, older[folded:], len(older)
+
+    def _summary_prompt(self, summary, to_fold):
+        return (
+            f"{SUMMARY_INSTRUCTION}\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            "New turns:\n" + "\n".join(message_line(m) for m in to_fold)
+            + "\n\nUpdated summary:"
+        )
+
+    def _assemble(self, history, window, summary, context, user_input):
+        recent_lines = [message_line(m) for m in history[len(history) - window:]]
+        history_text = ""
+        if summary:
+            history_text += f"Summary of earlier conversation:\n{summary}\n\n"
+        history_text += "\n".join(recent_lines)
+
+        # Context is trimmed last, only if the instruction, history and question already fill the budget
+        used = estimate_tokens(self.instruction) + estimate_tokens(history_text) + estimate_tokens(user_input)
+        context_budget = max(self.token_budget - used, 0)
+        if estimate_tokens(context) > context_budget:
+            context = context[:context_budget * 4]
+
+        prompt = (
+            f"{self.instruction}\n\n"
+            f"Conversation so far:\n{history_text}"
+            f"\n\nContext:\n{context}\n\nUser question: {user_input}\n\nAnswer:"
+        )
+        usage = {
+            "instruction": estimate_tokens(self.instruction),
+            "summary": estimate_tokens(summary),
+            "history": estimate_tokens(history_text),
+            "context": estimate_tokens(context),
+            "question": estimate_tokens(user_input),
+            "total": estimate_tokens(prompt),
+            "messages_verbatim": window,
+            "messages_summarized": len(history) - window,
+        }
+        return prompt, usage
+
+    def build(self, thread_id, history, context, user_input):
+        """
+        `history` is the prior messages, excluding the current question.
+        Returns (prompt, usage) where usage holds the estimated tokens per section.
+        """
+        window, summary, to_fold, folded = self._plan(thread_id, history, context, user_input)
+        if to_fold:
+            response = self.get_llm().invoke(self._summary_prompt(summary, to_fold))
+            summary = getattr(response, "content", response).strip()
+            self._store_summary(thread_id, folded, summary)
+        return self._assemble(history, window, summary, context, user_input)
+
+    async def abuild(self, thread_id, history, context, user_input):
+        """Async version of `build`, for the FastAPI backend."""
+        window, summary, to_fold, folded = self._plan(thread_id, history, context, user_input)
+        if to_fold:
+            response = await self.get_llm().ainvoke(self._summary_prompt(summary, to_fold))
+            summary = getattr(response, "content", response).strip()
+            self._store_summary(thread_id, folded, summary)
+        return self._assemble(history, window, summary, context, user_input)
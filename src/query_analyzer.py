@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+CODES_CSV_PATH = os.path.join(DATA_DIR, "iso_codes_and_titles.csv")
+ICS_CSV_PATH = os.path.join(DATA_DIR, "ICS.csv")
+ICS_CODE_INDEX_PATH = os.getenv("ICS_CODE_INDEX_PATH", os.path.join(DATA_DIR, "ics_code_index.json"))
+# Subject hints only boost retrieval when they are this specific (ICS depth) and this few
+ICS_MIN_DEPTH = 2
+ICS_MAX_HINTS = 2
+
+# One code shape for questions and crawled codes: any ISO/IEC/TS/IEEE... prefix, number and part; the year is
+# optional in questions
+CODE_FORM = r"ISO(?:/[A-Z]+)*\s?(\d+(?:-\d+)?)"
+CODE_RE = re.compile(r"\b" + CODE_FORM + r"(?::(\d{4}))?", re.IGNORECASE)
+FULL_CODE_RE = re.compile(r"(" + CODE_FORM + r":(\d{4}))")
+CLAUSE_RE = re.compile(r"(?:\b(?:clause|section|sub-?clause)|§)\s*(\d+(?:\.\d+)*)", re.IGNORECASE)
+# A bare dotted number is only a clause right after a standard's code ("ISO 9001 8.5"); elsewhere it is
+# usually a measurement ("2.5 mm")
+CODE_CLAUSE_RE = re.compile(r"\b" + CODE_FORM + r"(?::\d{4})?,?\s+(\d+\.\d+(?:\.\d+)*)\b", re.IGNORECASE)
+
+# Multi-word ICS title fragments too generic to signal a subject on their own
+GENERIC_PHRASES = {"in general", "their components", "their alloys", "related equipment", "derived products",
+                   "components for general use", "in relevant technical product documentation"}
+
+
+def load_ics_tree(path=ICS_CSV_PATH):
+    """Returns {identifier: titleEn} for every node of the ICS tree."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return {row["identifier"]: row["titleEn"] for row in csv.DictReader(f)}
+
+
+def load_code_titles(path=CODES_CSV_PATH):
+    """Returns {code: {"title", "ics"}} from the crawled standards list; `ics` is empty for older crawls."""
+    titles = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            code = row.get("ISO Codes") or row.get("code")
+            if code and code not in titles:
+                titles[code] = {"title": row.get("Title") or row.get("title", ""), "ics": row.get("ics", "")}
+    return titles
+
+
+def build_ics_code_index(codes_csv=CODES_CSV_PATH, path=ICS_CODE_INDEX_PATH):
+    """
+    Precomputes {ICS identifier: [codes]} from the `ics` column crawl_iso_codes.py records, one entry
+    per ICS node a standard is listed under. Standards crawled without it are left out.
+    """
+    index = {}
+    with open(codes_csv, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            code, ics = row.get("ISO Codes") or row.get("code"), row.get("ics")
+            if code and ics and code not in index.get(ics, []):
+                index.setdefault(ics, []).append(code)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    print(f"Indexed {sum(len(c) for c in index.values())} codes under {len(index)} ICS nodes.")
+    return index
+
+
+class QueryAnalyzer:
+    """
+    Pulls ISO codes, a clause number and ICS subject hints out of a question. Named codes restrict
+    retrieval; subject hints only resolve to codes whose chunks retrieval ranks higher.
+    """
+
+    def __init__(self, codes_csv=CODES_CSV_PATH, ics_csv=ICS_CSV_PATH, ics_index_path=ICS_CODE_INDEX_PATH,
+                 extra_codes=()):
+        # "9001" -> ["ISO 9001:2015", ...], so questions without a year still resolve
+        self.codes_by_number = {}
+        known = set(extra_codes)
+        if os.path.exists(codes_csv):
+            known.update(load_code_titles(codes_csv))
+        for code in known:
+            match = FULL_CODE_RE.match(code)
+            if match:
+                self.codes_by_number.setdefault(match.group(2), []).append(code)
+
+        self.ics_codes = {}
+        if os.path.exists(ics_index_path):
+            with open(ics_index_path, "r", encoding="utf-8") as f:
+                self.ics_codes = json.load(f)
+
+        # Without the ICS→code index a subject hint resolves to no codes, so there is nothing to match
+        self.ics_phrases = []
+        if self.ics_codes and os.path.exists(ics_csv):
+            for identifier, title in load_ics_tree(ics_csv).items():
+                for phrase in re.split(r"[.,;]| and ", title.lower()):
+                    phrase = " ".join(phrase.split())
+                    # Single words ("safety", "welding") appear under too many unrelated subjects
+                    if len(phrase.split()) >= 2 and phrase not in GENERIC_PHRASES:
+                        pattern = re.compile(r"\b" + re.escape(phrase) + r"\b")
+                        self.ics_phrases.append((identifier, pattern))
+
+    def extract_codes(self, question):
+        codes = []
+        for number, year in CODE_RE.findall(question):
+            candidates = self.codes_by_number.get(number, [])
+            if year:
+                candidates = [c for c in candidates if c.endswith(f":{year}")]
+            codes.extend(c for c in candidates if c not in codes)
+        return codes
+
+    def extract_clause(self, question):
+        match = CLAUSE_RE.search(CODE_RE.sub(" ", question))
+        if match:
+            return match.group(1)
+        match = CODE_CLAUSE_RE.search(question)
+        return match.group(2) if match else None
+
+    def extract_ics(self, question):
+        text = question.lower()
+        matched = {identifier for identifier, pattern in self.ics_phrases if pattern.search(text)}
+        # Keep the most specific nodes: drop any match that is an ancestor of another match
+        return sorted(i for i in matched if not any(other.startswith(i + ".") for other in matched))
+
+    def codes_for_ics(self, ics_ids):
+        codes = []
+        for ics, ics_codes in self.ics_codes.items():
+            if any(ics == i or ics.startswith(i + ".") for i in ics_ids):
+                codes.extend(ics_codes)
+        return codes
+
+    def analyze(self, question):
+        """
+        Returns {"codes", "clause", "ics", "restrict_to", "boost"}. `restrict_to` is the code list retrieval
+        is limited to (codes named in the question), None means search everything; `boost` lists the codes
+        of the ICS subjects mentioned, whose chunks are ranked higher but never required.
+        """
+        codes = self.extract_codes(question)
+        ics = [] if codes else self.extract_ics(question)
+        specific = [i for i in ics if i.count(".") + 1 >= ICS_MIN_DEPTH]
+        boost = self.codes_for_ics(specific) if specific and len(ics) <= ICS_MAX_HINTS else []
+        return {"codes": codes, "clause": self.extract_clause(question), "ics": ics,
+                "restrict_to": codes or None, "boost": boost}
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        build_ics_code_index()
+    else:
+        analyzer = QueryAnalyzer()
+        print(analyzer.analyze(" ".join(sys.argv[1:])))
@@ -0,0 +1,184 @@
+import hashlib
+import os
+from dotenv import load_dotenv
+# file imports
+from config.vertex_config import get_vector_store, get_embeddings
+from config.lazy import lazy
+from config.local_store import LocalVectorStore
+from src.bm25 import load_index, BM25_INDEX_DIR
+from src.query_analyzer import QueryAnalyzer, ICS_CODE_INDEX_PATH
+from src.dedup import load_shared_codes
+from src.context_packer import mmr_rerank, pack_context, CONTEXT_TOKEN_BUDGET, MMR_FETCH_FACTOR
+
+load_dotenv()
+
+# "dense" (vector store only), "hybrid" (vector + BM25 fused) or "lexical" (BM25 only, no embedding call)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Candidates fetched from each retriever before fusion, as a multiple of k
+HYBRID_FETCH_FACTOR = int(os.getenv("HYBRID_FETCH_FACTOR", "3"))
+# Set QUERY_PREFILTER=0 to always search the whole corpus
+QUERY_PREFILTER = os.getenv("QUERY_PREFILTER", "1") == "1"
+# Remote stores cannot filter on code, so they over-fetch and filter the hits
+PREFILTER_OVERFETCH = int(os.getenv("PREFILTER_OVERFETCH", "10"))
+# Places a chunk moves up when its standard is under an ICS subject the question mentions
+ICS_BOOST_RANKS = int(os.getenv("ICS_BOOST_RANKS", "3"))
+# Candidates fetched, as a multiple of k, when the question names a clause and its chunks are moved up
+CLAUSE_FETCH_FACTOR = int(os.getenv("CLAUSE_FETCH_FACTOR", "2"))
+
+
+@lazy
+def get_bm25_index():
+    bm25_index = load_index(BM25_INDEX_DIR) if RETRIEVAL_MODE != "dense" else None
+    if RETRIEVAL_MODE != "dense" and bm25_index is None:
+        print(f"No BM25 index at {BM25_INDEX_DIR}; falling back to dense retrieval. Build it with `python -m src.bm25`.")
+    return bm25_index
+
+
+@lazy
+def get_shared_codes():
+    """{chunk id: [codes]} of standards whose chunks were merged into another standard's at ingestion."""
+    shared = load_shared_codes()
+    vector_store = get_vector_store()
+    if isinstance(vector_store, LocalVectorStore):
+        vector_store.index_shared_codes(shared)
+    return shared
+
+
+@lazy
+def get_query_analyzer():
+    """Built on first use: it reads the codes held by the BM25 index and the local vector store."""
+    if not QUERY_PREFILTER:
+        return None
+    bm25_index = get_bm25_index()
+    indexed_codes = set(bm25_index.code_rows) if bm25_index else set()
+    indexed_codes.update(code for codes in get_shared_codes().values() for code in codes)
+    vector_store = get_vector_store()
+    if isinstance(vector_store, LocalVectorStore):
+        indexed_codes.update(c for c in vector_store._code_rows if c)
+    query_analyzer = QueryAnalyzer(extra_codes=indexed_codes)
+    if not query_analyzer.ics_codes:
+        print(f"No ICS→code index at {ICS_CODE_INDEX_PATH}; ICS subject boosting is disabled. "
+              f"See the QUERY_PREFILTER notes in the README to build it.")
+    return query_analyzer
+
+
+def doc_key(doc):
+    """Identity used to fuse results; chunk ids are content hashes, so fall back to hashing the text."""
+    return doc.id or hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(result_lists, k=5, rrf_k=RRF_K):
+    """Merges ranked lists of Documents, scoring each by sum(1 / (rrf_k + rank)) across lists."""
+    scores = {}
+    docs = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, 1):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked[:k]]
+
+
+def store_search(vector_store, query, k, query_vector=None, **kwargs):
+    # A query embedded once by the caller (see retrieve_context) is not embedded again here
+    if query_vector is None:
+        return vector_store.similarity_search(query, k=k, **kwargs)
+    return vector_store.similarity_search_by_vector(query_vector, k=k, **kwargs)
+
+
+def dense_search(query, k, codes=None, query_vector=None):
+    vector_store = get_vector_store()
+    if codes is None:
+        return store_search(vector_store, query, k, query_vector)
+    get_shared_codes()  # on first use, teaches the local store's code filter the merged standards
+    if isinstance(vector_store, LocalVectorStore):
+        return store_search(vector_store, query, k, query_vector, filter={"code": codes})
+    allowed = set(codes)
+    hits = store_search(vector_store, query, k * PREFILTER_OVERFETCH, query_vector)
+    return [doc for doc in hits if not allowed.isdisjoint(chunk_codes(doc))][:k]
+
+
+def lexical_search(query, k, codes=None):
+    rows = None if codes is None else get_bm25_index().rows_for_codes(codes)
+    return get_bm25_index().similarity_search(query, k=k, allowed_rows=rows)
+
+
+def search(query, k, mode, codes=None, query_vector=None):
+    if get_bm25_index() is None or mode == "dense":
+        return dense_search(query, k, codes, query_vector)
+    if mode == "lexical":
+        return lexical_search(query, k, codes)
+    fetch = k * HYBRID_FETCH_FACTOR
+    return reciprocal_rank_fusion([dense_search(query, fetch, codes, query_vector), lexical_search(query, fetch, codes)],
+                                  k=k)
+
+
+def chunk_codes(doc):
+    # Chunks deduplicated before the shared-code index existed list every standard under "codes"
+    return (doc.metadata.get("codes") or [doc.metadata.get("code")]) + get_shared_codes().get(doc.id, [])
+
+
+def boost_codes(results, codes, ranks=ICS_BOOST_RANKS):
+    """Moves chunks of `codes` up by `ranks` places; the others keep their order and nothing is dropped."""
+    wanted = set(codes)
+    order = {id(doc): rank - (ranks if not wanted.isdisjoint(chunk_codes(doc)) else 0)
+             for rank, doc in enumerate(results)}
+    return sorted(results, key=lambda doc: order[id(doc)])
+
+
+def in_clause(doc, clause):
+    chunk_clause = doc.metadata.get("clause") or ""
+    return chunk_clause == clause or chunk_clause.startswith(clause + ".")
+
+
+def retrieve(query, k=5, mode=None, fetch_k=None, rerank=None, query_vector=None):
+    """
+    Top-k chunks for `query` using the configured retrieval mode. ISO codes named in the question
+    restrict the search to those standards; the whole corpus is searched if that finds nothing.
+    Standards under an ICS subject the question mentions are ranked higher, and chunks from a
+    clause named in the question are ranked first.
+    With `rerank`, `fetch_k` candidates are fetched and rerank(query, candidates) orders all of them;
+    the ICS and clause preferences apply to that whole order before it is cut to k.
+    `query_vector`, if given, is the query's embedding and is used instead of embedding it again.
+    """
+    mode = mode or RETRIEVAL_MODE
+    query_analyzer = get_query_analyzer()
+    analysis = (query_analyzer.analyze(query) if query_analyzer
+                else {"restrict_to": None, "clause": None, "boost": []})
+    codes, clause = analysis["restrict_to"], analysis["clause"]
+    fetch = max(fetch_k or k, k * CLAUSE_FETCH_FACTOR if clause else k)
+    results = search(query, fetch, mode, codes, query_vector)
+    if codes and not results:
+        results = search(query, fetch, mode, query_vector=query_vector)
+    if rerank:
+        results = rerank(query, results)
+    if analysis["boost"]:
+        results = boost_codes(results, analysis["boost"])
+    if clause:
+        results = sorted(results, key=lambda doc: not in_clause(doc, clause))
+    return results[:k]
+
+
+def retrieve_context(query, k=5, mode=None, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Chunks to put in the prompt: MMR picks k diverse chunks from MMR_FETCH_FACTOR * k candidates
+    using the vectors the local store already holds (skipped in lexical mode, which must not call the
+    embedding model, and on stores that cannot return stored vectors), adjacent chunks of the same
+    standard are merged and the result is packed into `token_budget`. Returns (docs, report).
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode == "lexical" or MMR_FETCH_FACTOR <= 1 or not isinstance(get_vector_store(), LocalVectorStore):
+        selected = retrieve(query, k, mode)
+        return pack_context(selected, selected, token_budget)
+    # Embedded once, for both the search and MMR
+    query_vector = get_embeddings().embed_query(query)
+    candidates = []
+
+    def rerank(q, docs):
+        candidates.extend(docs)
+        return mmr_rerank(query_vector, docs)
+
+    selected = retrieve(query, k, mode, fetch_k=k * MMR_FETCH_FACTOR, rerank=rerank, query_vector=query_vector)
+    return pack_context(selected, candidates[:k], token_budget)
@@ -0,0 +1,17 @@
+import os
+import sys
+import mongomock
+import pytest
+
+# Tests import the app's modules the way its scripts do, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import db_config
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """An empty in-memory Mongo behind db_config (mongomock, see requirements-dev.txt)."""
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db_config, "get_client", lambda: client)
+    return client[db_config.DB_NAME]
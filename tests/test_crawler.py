@@ -0,0 +1,164 @@
+import asyncio
+import json
+import os
+import re
+import sys
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+import pytest
+
+# The crawlers import each other as top-level modules, the way they are run from web_crawlers/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "web_crawlers"))
+
+from crawl_engine import CrawlEngine, NotFound
+from crawl_iso_data import check_response, fetch_sample
+from extract import extract_sample_text
+from fixture_server import start_fixture_server, write_sample_pages
+
+CODES = ["ISO 9001:2015", "ISO 14001:2015", "ISO 45001:2018"]
+
+
+@pytest.fixture
+def pages(tmp_path):
+    pages_dir = str(tmp_path / "pages")
+    write_sample_pages(pages_dir, CODES)
+    return pages_dir
+
+
+@pytest.fixture
+def serve(pages):
+    servers = []
+
+    def serve(**kwargs):
+        server, base_url = start_fixture_server(pages, **kwargs)
+        servers.append(server)
+        return base_url
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+
+
+def get(url):
+    """(response, body) with the status fields check_response reads off a Playwright response."""
+    try:
+        with urlopen(url) as r:
+            return SimpleNamespace(status=r.status, ok=True, url=url), r.read().decode("utf-8")
+    except HTTPError as e:
+        return SimpleNamespace(status=e.code, ok=False, url=url), ""
+
+
+def http_fetch(base_url):
+    """fetch_sample's steps over plain HTTP, for running the engine where no browser is installed."""
+
+    async def fetch(page, code, limiter):
+        for path in ("/home.html", f"/search?q={quote(code)}"):
+            await limiter.acquire()
+            response, body = await asyncio.to_thread(get, base_url + path)
+            check_response(response)
+        link = re.search(r'href="(/standard/[^"]+)"', body)
+        if not link:
+            raise NotFound(f"No results for {code}")
+        await limiter.acquire()
+        response, body = await asyncio.to_thread(get, base_url + link.group(1))
+        check_response(response)
+        sample = re.search(r'href="(/sample/[^"]+)"', body)
+        if not sample:
+            raise NotFound(f"No sample for {code}")
+        await limiter.acquire()
+        response, body = await asyncio.to_thread(get, base_url + sample.group(1))
+        check_response(response)
+        return {"code": code, "text": extract_sample_text(body)}
+
+    return fetch
+
+
+async def new_page():
+    return None
+
+
+async def close_page(page):
+    pass
+
+
+def engine(tmp_path, fetch, **kwargs):
+    return CrawlEngine(fetch, new_page, str(tmp_path / "docs.jsonl"), str(tmp_path / "journal.jsonl"),
+                       close_page=close_page, rate=1000, burst=100, backoff=0.01, **kwargs)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_error_statuses_are_retried(tmp_path, serve):
+    # Every URL answers 503 once, so each code needs four retries (one per page it visits)
+    base_url = serve(fail_first=1)
+    stats = asyncio.run(engine(tmp_path, http_fetch(base_url), concurrency=1, max_retries=5).run(CODES[:1]))
+
+    assert stats["saved"] == 1 and stats["retries"] == 4
+    assert "requirement 1" in read_jsonl(tmp_path / "docs.jsonl")[0]["text"]
+    assert read_jsonl(tmp_path / "journal.jsonl") == [{"code": CODES[0], "status": "saved"}]
+
+
+def test_codes_failing_every_attempt_are_not_journaled(tmp_path, serve):
+    base_url = serve(fail_first=100)
+    stats = asyncio.run(engine(tmp_path, http_fetch(base_url), max_retries=2).run(CODES[:2]))
+
+    assert stats["failed"] == 2 and stats["not_found"] == 0
+    assert read_jsonl(tmp_path / "journal.jsonl") == []
+
+
+def test_resume_skips_journaled_codes(tmp_path, serve):
+    base_url = serve()
+    # "ISO 1:2000" has no page on the fixture server
+    first = asyncio.run(engine(tmp_path, http_fetch(base_url)).run(CODES[:2] + ["ISO 1:2000"]))
+    assert (first["saved"], first["not_found"]) == (2, 1)
+
+    second = asyncio.run(engine(tmp_path, http_fetch(base_url)).run(CODES + [CODES[2], "ISO 1:2000"]))
+    assert (second["saved"], second["skipped"], second["duplicates"]) == (1, 3, 1)
+    assert sorted(r["code"] for r in read_jsonl(tmp_path / "docs.jsonl")) == sorted(CODES)
+
+
+@pytest.fixture
+def browser():
+    playwright_api = pytest.importorskip("playwright.async_api")
+
+    async def launch():
+        playwright = await playwright_api.async_playwright().start()
+        try:
+            return playwright, await playwright.chromium.launch()
+        except Exception as e:
+            await playwright.stop()
+            pytest.skip(f"Chromium is not installed for Playwright: {e}")
+
+    return launch
+
+
+def test_fetch_sample_against_fixture_server(tmp_path, serve, browser):
+    # Error statuses are covered above: fetch_sample only checks the navigations it can observe, so a 503 on the
+    # search or sample page would be retried only after its selector wait times out
+    base_url = serve()
+
+    async def crawl():
+        playwright, chromium = await browser()
+
+        async def browser_page():
+            return await chromium.new_page()
+
+        async def fetch(page, code, limiter):
+            return await fetch_sample(page, code, limiter, base_url=base_url)
+
+        try:
+            crawler = CrawlEngine(fetch, browser_page, str(tmp_path / "docs.jsonl"), str(tmp_path / "journal.jsonl"),
+                                  concurrency=2, rate=1000, burst=100, backoff=0.01, max_retries=5)
+            return await crawler.run(CODES)
+        finally:
+            await chromium.close()
+            await playwright.stop()
+
+    stats = asyncio.run(crawl())
+    assert stats["saved"] == len(CODES)
+    assert sorted(r["code"] for r in read_jsonl(tmp_path / "docs.jsonl")) == sorted(CODES)
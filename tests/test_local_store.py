@@ -0,0 +1,140 @@
+import json
+import numpy as np
+import pytest
+# file imports
+from config.fakes import HashEmbeddings
+from config.local_store import LocalVectorStore, VECTORS_FILE, CHUNKS_FILE
+from src import retrieval
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore(HashEmbeddings(), path=str(tmp_path / "index"), nprobe=2)
+
+
+def search_ids(store, query, k=3, **kwargs):
+    return [doc.id for doc in store.similarity_search(query, k=k, **kwargs)]
+
+
+def test_search_returns_closest_text(store):
+    store.add_texts(["quality management systems requirements", "welding of steel pipes", "food safety hazards"],
+                    ids=["qms", "weld", "food"])
+
+    assert search_ids(store, "welding steel", k=1) == ["weld"]
+    doc, score = store.similarity_search_with_score("food safety hazards", k=1)[0]
+    assert doc.id == "food" and score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_known_ids_are_updated_in_place(store):
+    store.add_texts(["quality management", "welding"], metadatas=[{"code": "ISO 9001"}, {"code": "ISO 3834"}],
+                    ids=["a", "b"])
+    store.add_texts(["environmental management"], metadatas=[{"code": "ISO 14001"}], ids=["a"])
+
+    assert store.count == 2
+    assert store.get_by_ids(["a"])[0].page_content == "environmental management"
+    assert search_ids(store, "environmental management", k=1) == ["a"]
+    assert search_ids(store, "management", filter={"code": "ISO 9001"}) == []
+    assert search_ids(store, "management", filter={"code": "ISO 14001"}) == ["a"]
+
+
+def test_code_filter_matches_code_codes_and_shared_codes(store):
+    store.add_texts(
+        ["scope of the quality management system", "scope of the welding quality requirements", "hazard analysis"],
+        metadatas=[{"code": "ISO 9001"}, {"code": "ISO 3834-2", "codes": ["ISO 3834-2", "ISO 3834-3"]},
+                   {"code": "ISO 22000"}],
+        ids=["qms", "weld", "food"],
+    )
+    store.index_shared_codes({"qms": ["ISO 9004"], "missing": ["ISO 1"]})
+
+    assert search_ids(store, "scope", filter={"code": "ISO 3834-3"}) == ["weld"]
+    assert search_ids(store, "scope", filter={"code": "ISO 9004"}) == ["qms"]
+    assert set(search_ids(store, "scope", filter={"code": ["ISO 9001", "ISO 22000"]})) == {"qms", "food"}
+    assert search_ids(store, "scope", filter={"code": "ISO 1"}) == []
+
+
+def test_reload_from_disk(store):
+    store.add_texts(["quality management", "welding"], metadatas=[{"code": "ISO 9001"}, {"code": "ISO 3834"}],
+                    ids=["a", "b"])
+    store.add_texts(["welding coordination"], metadatas=[{"code": "ISO 14731"}], ids=["b"])
+
+    reloaded = LocalVectorStore(HashEmbeddings(), path=store.path)
+    assert (reloaded.count, reloaded.dim) == (2, store.dim)
+    assert reloaded.get_by_ids(["b"])[0].page_content == "welding coordination"
+    assert search_ids(reloaded, "welding", filter={"code": "ISO 14731"}) == ["b"]
+    np.testing.assert_array_equal(np.asarray(reloaded._matrix), np.asarray(store._matrix))
+
+
+def test_rows_appended_after_the_last_meta_write_are_dropped(store):
+    store.add_texts(["quality management", "welding"], ids=["a", "b"])
+    # An add_texts that died before writing meta.json
+    with open(store._file(VECTORS_FILE), "ab") as f:
+        np.ones(store.dim, dtype=np.float32).tofile(f)
+    with open(store._file(CHUNKS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"id": "orphan", "text": "orphan", "metadata": {}}) + "\n")
+
+    reloaded = LocalVectorStore(HashEmbeddings(), path=store.path)
+    reloaded.add_texts(["food safety hazards"], ids=["c"])
+    doc, score = reloaded.similarity_search_with_score("food safety hazards", k=1)[0]
+    assert doc.id == "c" and score == pytest.approx(1.0, abs=1e-5)
+
+    reloaded = LocalVectorStore(HashEmbeddings(), path=store.path)
+    assert [c["id"] for c in reloaded._chunks] == ["a", "b", "c"]
+    assert search_ids(reloaded, "food safety hazards", k=1) == ["c"]
+
+
+def test_ivf_probe_finds_the_exact_match(store):
+    texts = [f"standard {n} topic {n % 7} part {n % 5}" for n in range(64)]
+    store.add_texts(texts, ids=[str(n) for n in range(64)])
+    exact = search_ids(store, texts[10], k=1)
+
+    store.build_ivf(nlist=4, iterations=5)
+    assert store._assign.shape == (64,)
+    assert search_ids(store, texts[10], k=1) == exact == ["10"]
+
+    # New rows are assigned to a partition and stay searchable
+    store.add_texts(["welding of aluminium alloys"], ids=["new"])
+    assert store._assign.shape == (65,)
+    store.nprobe = 4
+    assert search_ids(store, "welding of aluminium alloys", k=1) == ["new"]
+
+
+@pytest.fixture
+def corpus(store, monkeypatch):
+    store.add_texts(
+        [
+            "the organization shall determine the scope of the quality management system",
+            "the organization shall control nonconforming outputs",
+            "top management shall establish the environmental policy",
+            "the organization shall determine environmental aspects",
+        ],
+        metadatas=[
+            {"code": "ISO 9001:2015", "clause": "4.3"},
+            {"code": "ISO 9001:2015", "clause": "8.7"},
+            {"code": "ISO 14001:2015", "clause": "5.2"},
+            {"code": "ISO 14001:2015", "clause": "6.1.2"},
+        ],
+        ids=["qms-scope", "qms-nc", "ems-policy", "ems-aspects"],
+    )
+    monkeypatch.setattr(retrieval, "get_vector_store", lambda: store)
+    monkeypatch.setattr(retrieval, "get_bm25_index", lambda: None)
+    monkeypatch.setattr(retrieval, "get_shared_codes", lambda: {})
+    monkeypatch.setattr(retrieval, "get_query_analyzer",
+                        lambda: retrieval.QueryAnalyzer(extra_codes={"ISO 9001:2015", "ISO 14001:2015"}))
+    return store
+
+
+def test_retrieve_restricts_to_named_standard(corpus):
+    results = retrieval.retrieve("ISO 14001 what shall the organization determine", k=2, mode="dense")
+    assert {doc.metadata["code"] for doc in results} == {"ISO 14001:2015"}
+
+
+def test_retrieve_ranks_named_clause_first(corpus):
+    results = retrieval.retrieve("what does clause 8.7 say the organization shall do", k=2, mode="dense")
+    assert results[0].id == "qms-nc"
+
+
+def test_retrieve_falls_back_to_whole_corpus(corpus):
+    # A standard the analyzer knows but the index holds no chunks of
+    assert retrieval.get_query_analyzer().analyze("ISO 22000 environmental policy")["restrict_to"]
+    results = retrieval.retrieve("ISO 22000 environmental policy", k=1, mode="dense")
+    assert [doc.id for doc in results] == ["ems-policy"]
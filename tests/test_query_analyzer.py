@@ -0,0 +1,29 @@
+import pytest
+# file imports
+from src.query_analyzer import QueryAnalyzer
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return QueryAnalyzer(extra_codes={"ISO 9001:2015", "ISO 14001:2015", "ISO/IEC 27001:2022"})
+
+
+@pytest.mark.parametrize("question, clause", [
+    ("what does clause 8.7 say", "8.7"),
+    ("ISO 9001 section 7", "7"),
+    ("§ 4.2 of ISO 14001", "4.2"),
+    ("ISO 9001 8.5", "8.5"),
+    ("ISO 9001:2015 8.5.1 production", "8.5.1"),
+    ("ISO/IEC 27001, 5.2 policy", "5.2"),
+    ("requirements for 2.5 mm steel pipes", None),
+    ("does ISO 9001 apply to 2.5 mm steel pipes", None),
+])
+def test_extract_clause(analyzer, question, clause):
+    assert analyzer.extract_clause(question) == clause
+
+
+def test_named_codes_restrict_retrieval(analyzer):
+    analysis = analyzer.analyze("ISO 9001 clause 8.5 and ISO/IEC 27001")
+    assert analysis["restrict_to"] == ["ISO 9001:2015", "ISO/IEC 27001:2022"]
+    assert analysis["clause"] == "8.5"
+    assert analyzer.analyze("welding of 2.5 mm steel pipes")["restrict_to"] is None
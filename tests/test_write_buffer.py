@@ -0,0 +1,119 @@
+import pytest
+# file imports
+from config import db_config
+from config.write_buffer import WriteBuffer
+
+
+def message(n):
+    return {"role": "user" if n % 2 == 0 else "assistant", "content": f"message {n}"}
+
+
+def stored_seqs(mongo, thread_id):
+    """{bucket: [seq, ...]} as written to the message_buckets collection."""
+    return {b["bucket"]: [m["seq"] for m in b["messages"]]
+            for b in mongo["message_buckets"].find({"thread_id": thread_id})}
+
+
+@pytest.fixture
+def buffer(mongo):
+    # A long interval keeps the background flusher out of the way; tests flush explicitly
+    buffer = WriteBuffer(max_pending=1000, interval=3600, enabled=True)
+    yield buffer
+    buffer.close()
+
+
+class FlakyBuckets:
+    """message_buckets() stand-in whose first `failures` bulk writes fail before reaching Mongo."""
+
+    def __init__(self, collection, failures=1):
+        self.collection = collection
+        self.failures = failures
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("bulk_write failed")
+        return self.collection.bulk_write(*args, **kwargs)
+
+
+def test_reads_see_buffered_writes(buffer, mongo):
+    for n in range(3):
+        buffer.save_message("t1", message(n), title="Title")
+
+    assert mongo["message_buckets"].count_documents({}) == 0
+    assert buffer.get_thread_messages("t1") == [message(n) for n in range(3)]
+    assert buffer.get_thread_page("t1", limit=2)["messages"] == [message(1), message(2)]
+
+    assert buffer.flush() == 3
+    buffer.save_message("t1", message(3))
+    # Stored and buffered messages read back as one thread
+    assert buffer.get_thread_messages("t1") == [message(n) for n in range(4)]
+    page = buffer.get_thread_page("t1", before=3, limit=2)
+    assert page == {"messages": [message(1), message(2)], "has_more": True, "next_before": 1}
+    assert mongo["threads"].find_one({"thread_id": "t1"})["title"] == "Title"
+
+
+def test_failed_flush_is_retried_with_its_reserved_seqs(buffer, mongo, monkeypatch):
+    flaky = FlakyBuckets(mongo["message_buckets"])
+    monkeypatch.setattr(db_config, "message_buckets", lambda: flaky)
+    buffer.save_message("t1", message(0))
+    buffer.save_message("t1", message(1))
+
+    assert buffer.flush() == 0
+    # The sequence numbers were reserved before the bucket write failed
+    assert db_config.thread_message_count("t1") == 2
+    buffer.save_message("t1", message(2))
+    assert buffer.get_thread_messages("t1") == [message(n) for n in range(3)]
+
+    assert buffer.flush() == 3
+    assert db_config.thread_message_count("t1") == 3
+    assert stored_seqs(mongo, "t1") == {0: [0, 1, 2]}
+    assert db_config.get_thread_messages("t1") == [message(n) for n in range(3)]
+    assert buffer.buffered("t1") == []
+
+
+def test_messages_fill_buckets_of_message_bucket_size(buffer, mongo, monkeypatch):
+    monkeypatch.setattr(db_config, "BUCKET_SIZE", 3)
+    for n in range(2):
+        buffer.save_message("t1", message(n))
+    buffer.flush()
+    for n in range(2, 7):
+        buffer.save_message("t1", message(n))
+    buffer.flush()
+
+    assert stored_seqs(mongo, "t1") == {0: [0, 1, 2], 1: [3, 4, 5], 2: [6]}
+    # Ranges that cross a bucket boundary read from both buckets
+    assert db_config.read_messages("t1", 2, 5) == [message(n) for n in range(2, 5)]
+    page = db_config.get_thread_page("t1", before=6, limit=4)
+    assert page == {"messages": [message(n) for n in range(2, 6)], "has_more": True, "next_before": 2}
+
+
+def test_close_flushes_and_later_writes_go_straight_to_mongo(mongo):
+    buffer = WriteBuffer(max_pending=1000, interval=3600, enabled=True)
+    buffer.save_message("t1", message(0), title="Title")
+    buffer.save_message("t2", message(1), title="Other")
+
+    buffer.close()
+    assert db_config.get_thread_messages("t1") == [message(0)]
+    assert db_config.get_thread_messages("t2") == [message(1)]
+
+    buffer.save_message("t1", message(2))
+    assert buffer.buffered("t1") == []
+    assert db_config.get_thread_messages("t1") == [message(0), message(2)]
+
+
+def test_messages_saved_before_the_backfill_follow_legacy_messages(buffer, mongo):
+    legacy = [message(0), message(1)]
+    mongo["threads"].insert_one({"thread_id": "t1", "title": "Legacy", "messages": legacy})
+    db_config.save_message("t1", message(2), title="New title")
+    buffer.save_message("t1", message(3))
+    buffer.flush()
+
+    db_config.backfill_thread_fields()
+    thread = mongo["threads"].find_one({"thread_id": "t1"})
+    assert (thread["message_count"], thread["title"]) == (4, "Legacy")
+    assert stored_seqs(mongo, "t1") == {0: [2, 3]}
+    assert db_config.get_thread_messages("t1") == [message(n) for n in range(4)]
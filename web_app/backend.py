@@ -1,43 +1,138 @@
 from langchain.schema import HumanMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END, MessagesState, START
-from langgraph.checkpoint.memory import MemorySaver
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import hashlib
+import json
 import os
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 import tempfile
+import time
 import uuid
 # file import
-from config.db_config import save_message, get_thread_messages, threads
-from config.vertex_config import llm, instruction, vector_store
-from pdf_parser import process_pdf_for_embedding
+from config.db_config import (get_ingested_file, ensure_indexes, list_threads, ping as ping_mongo,
+                              create_thread as db_create_thread, update_thread_title as db_update_thread_title,
+                              THREADS_PAGE_SIZE, MESSAGES_PAGE_SIZE)
+from config.write_buffer import WriteBuffer
+from config.vertex_config import get_llm, get_embeddings, get_vector_store, instruction
+from config.answer_cache import AnswerCache, normalize_question, history_digest
+from config.memory import BoundedMemorySaver
+from config.metrics import (span, start_request, server_timing, render as render_metrics, SERVER_TIMING,
+                            REQUEST_SECONDS, STAGE_SECONDS, PROMPT_TOKENS, CONTEXT_CHARS, CONTEXT_TOKENS,
+                            CONTEXT_TOKENS_SAVED, RETRIEVAL_K, ANSWER_CACHE_LOOKUPS)
+from src.prompt_builder import PromptBuilder
+from src.retrieval import retrieve_context, doc_key, get_query_analyzer
+from jobs import JobQueue
+from pdf_extract import shutdown_pools
+from single_flight import SingleFlight
 
+# Bounded pool for calls that have no async client (pymongo, retrieval)
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))
+executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+# Set WARMUP=0 to only construct clients at startup, without priming their connections
+WARMUP = os.getenv("WARMUP", "1") == "1"
 
-def call_model(state: MessagesState):
-    user_input = state['messages'][-1].content
-    history = state.get("history", [])
+async def run_blocking(fn, *args, **kwargs):
+    """Runs a synchronous call on the bounded executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
 
-    results = vector_store.similarity_search(user_input, k=5)
+prompt_builder = PromptBuilder(instruction, get_llm)
+upload_jobs = JobQueue()
+# Chat messages are persisted write-behind; reads of a thread go through the buffer too
+write_buffer = WriteBuffer()
+answer_cache = AnswerCache(embed_fn=lambda question: get_embeddings().embed_query(question))
+# Identical questions arriving together share one retrieval and generation
+single_flight = SingleFlight()
+UPLOAD_READ_SIZE = 1024 * 1024
 
+
+def format_context(results):
     context = ""
     for idx, doc in enumerate(results, 1):
         code = doc.metadata.get("code", f"Section {idx}")
+        if doc.metadata.get("clause"):
+            code = f"{code}, clause {doc.metadata['clause']}"
         context += f"[{code}]: {doc.page_content}\n"
+    return context
 
-    history_lines = []
-    for m in state["messages"]:
-        if hasattr(m, "content"):
-            role = "User" if m.type == "human" else "Bot"
-            history_lines.append(f"{role}: {m.content}")
-
-    prompt = (
-        f"{instruction}\n\n"
-        f"Conversation so far:\n"
-        + "\n".join(history_lines)
-        + f"\n\nContext:\n{context}\n\nUser question: {user_input}\n\nAnswer:"
-    )
+def flight_key(thread_id, prior, question):
+    key = f"{normalize_question(question)}\0{history_digest(prior)}"
+    # Only opening questions are shared across threads; later turns depend on their own conversation
+    return f"{key}\0{thread_id}" if prior else key
+
+def citation(doc):
+    return {"code": doc.metadata.get("code"), "clause": doc.metadata.get("clause"),
+            "title": doc.metadata.get("title"), "page": doc.metadata.get("page")}
+
+async def retrieve_for(user_input):
+    """Retrieval stage shared by /chat and /chat/stream: (results, formatted context, chunk ids)."""
+    with span("retrieval"):
+        results, packing = await run_blocking(retrieve_context, user_input, k=5)
+    context = format_context(results)
+    CONTEXT_TOKENS.observe(packing["packed_tokens"])
+    CONTEXT_TOKENS_SAVED.inc(packing["tokens_saved"])
+    RETRIEVAL_K.observe(len(results))
+    CONTEXT_CHARS.observe(len(context))
+    return results, context, [doc_key(doc) for doc in results]
+
+async def cached_answer(user_input, chunk_ids, prior):
+    with span("answer_cache"):
+        answer = await run_blocking(answer_cache.get, user_input, chunk_ids, prior)
+    ANSWER_CACHE_LOOKUPS.labels("miss" if answer is None else "hit").inc()
+    return answer
+
+async def build_prompt(thread_id, prior, context, user_input):
+    with span("prompt_build"):
+        prompt, usage = await prompt_builder.abuild(thread_id, prior, context, user_input)
+    PROMPT_TOKENS.observe(usage["total"])
+    return prompt
 
-    response = llm.invoke(prompt)
+async def answer_question(thread_id, prior, user_input):
+    results, context, chunk_ids = await retrieve_for(user_input)
+    response = await cached_answer(user_input, chunk_ids, prior)
+    if response is None:
+        prompt = await build_prompt(thread_id, prior, context, user_input)
+        with span("llm"):
+            response = await get_llm().ainvoke(prompt)
+        await run_blocking(answer_cache.put, user_input, chunk_ids, prior, response)
+    return response
+
+async def stream_answer(thread_id, prior, user_input):
+    """Yields ("citations", [...]) once, then ("token", text) as the answer is generated."""
+    results, context, chunk_ids = await retrieve_for(user_input)
+    yield "citations", [citation(doc) for doc in results]
+
+    cached = await cached_answer(user_input, chunk_ids, prior)
+    if cached is not None:
+        yield "token", cached
+        return
+    prompt = await build_prompt(thread_id, prior, context, user_input)
+    answer = ""
+    start = time.perf_counter()
+    async for chunk in get_llm().astream(prompt):
+        if not answer:
+            STAGE_SECONDS.labels("llm_first_token").observe(time.perf_counter() - start)
+        part = getattr(chunk, "content", chunk)
+        answer += part
+        yield "token", part
+    STAGE_SECONDS.labels("llm").observe(time.perf_counter() - start)
+    await run_blocking(answer_cache.put, user_input, chunk_ids, prior, answer)
+
+async def call_model(state: MessagesState, config: RunnableConfig):
+    user_input = state['messages'][-1].content
+    history = state.get("history", [])
+    thread_id = config["configurable"]["thread_id"]
+    prior = state["messages"][:-1]
+
+    response = await single_flight.do(
+        flight_key(thread_id, prior, user_input), lambda: answer_question(thread_id, prior, user_input)
+    )
     history.append({"question": user_input, "answer": response})
     state["messages"].append(AIMessage(content=response))
     return {
@@ -51,7 +146,7 @@ graph = StateGraph(MessagesState)
 graph.add_node("RAG", call_model)
 graph.add_edge(START, "RAG")
 graph.add_edge("RAG", END)
-memory = MemorySaver()
+memory = BoundedMemorySaver()
 compiled_graph = graph.compile(checkpointer=memory)  
 
 # --- FastAPI section ---
@@ -60,36 +155,147 @@ app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
 
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    """Request latency by route; with SERVER_TIMING=1, the request's stage timings go in a Server-Timing header."""
+    timings = start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    # Route templates, not raw paths, keep label cardinality bounded
+    REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", response.status_code).observe(elapsed)
+    if SERVER_TIMING:
+        # For streamed responses this covers the work done before the first byte
+        response.headers["Server-Timing"] = server_timing(dict(timings, total=elapsed))
+    return response
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Startup state of each dependency: "pending", "ok" or the error that stopped it
+readiness = {"mongo": "pending", "vector_store": "pending", "llm": "pending", "retrieval": "pending"}
+warmup_task = None
+
+def warm_mongo():
+    ensure_indexes()
+    if WARMUP:
+        ping_mongo()
+
+def warm_vector_store():
+    vector_store = get_vector_store()
+    if WARMUP:
+        # One search opens the embedding and index connections the first question would otherwise wait on
+        vector_store.similarity_search("ISO warmup", k=1)
+
+async def init_dependency(name, fn):
+    try:
+        with span(f"startup_{name}"):
+            await run_blocking(fn)
+        readiness[name] = "ok"
+    except Exception as e:
+        readiness[name] = f"error: {e}"
+        print(f"Warmup of {name} failed, it will be retried on first use\n", e)
+
+async def warm_up():
+    """Builds every client in parallel. Requests that arrive first build what they need themselves."""
+    await asyncio.gather(
+        init_dependency("mongo", warm_mongo),
+        init_dependency("vector_store", warm_vector_store),
+        init_dependency("llm", get_llm),
+        init_dependency("retrieval", get_query_analyzer),
+    )
+
+@app.on_event("startup")
+async def start_warmup():
+    # In the background, so the server accepts connections (and answers /healthz) straight away
+    global warmup_task
+    warmup_task = asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+async def stop_warmup():
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once every dependency is initialized, 503 with their states until then."""
+    ready = all(state == "ok" for state in readiness.values())
+    return JSONResponse({"ready": ready, "dependencies": readiness}, status_code=200 if ready else 503)
+
+@app.on_event("shutdown")
+def shutdown_executor():
+    write_buffer.close()
+    upload_jobs.shutdown()
+    # Extraction can also run outside upload jobs; stopping an already stopped pool is a no-op
+    shutdown_pools()
+    executor.shutdown(wait=True)
+
 class ChatRequest(BaseModel):
     message: str
-    history: list 
+    # Omit to let the server load prior turns for thread_id itself
+    history: list | None = None
     thread_id: str = None
 
-@app.post("/chat")
-async def chat_endpoint(req: ChatRequest):
-    thread_id = req.thread_id or str(uuid.uuid4())
+def to_langchain_messages(history):
     messages = []
-    for msg in req.history:
+    for msg in history:
+        # Answers cut off mid-stream are kept for display but are not part of the conversation
+        if msg.get("truncated"):
+            continue
         if msg["role"] == "user":
             messages.append(HumanMessage(content=msg["content"]))
         elif msg["role"] == "assistant":
             messages.append(AIMessage(content=msg["content"]))
-    messages.append(HumanMessage(content=req.message))
+    return messages
+
+async def load_prior_messages(thread_id, config, history=None):
+    """
+    Returns (seed, prior): the messages the graph must be seeded with before this turn, and all prior messages.
+    Nothing is reseeded while the checkpointer still holds the thread; otherwise prior turns come
+    from the client-sent history if given, or from Mongo.
+    """
+    snapshot = await compiled_graph.aget_state(config)
+    cached = snapshot.values.get("messages", [])
+    if cached:
+        return [], cached
+    if history is None:
+        history = await run_blocking(write_buffer.get_thread_messages, thread_id)
+    seed = to_langchain_messages(history)
+    return seed, seed
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat")
+async def chat_endpoint(req: ChatRequest):
+    thread_id = req.thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    with span("load_history"):
+        seed, prior = await load_prior_messages(thread_id, config, req.history)
     state = {
-        "messages": messages,
+        "messages": seed + [HumanMessage(content=req.message)],
         "history": [],
         "thread_id": thread_id,
     }
-    config = {"configurable": {"thread_id": thread_id}}
 
     # --- Set chat title only if this is the very first message in this thread ---
-    is_new_chat = len(req.history) == 0
+    is_new_chat = len(prior) == 0
     chat_title = req.message[:50] if is_new_chat else None
 
-    # SAVE user message; set title only on new chat
-    save_message(thread_id, {"role": "user", "content": req.message}, title=chat_title)
+    # SAVE user message; set title only on new chat. Buffered, so Mongo latency is off the request path
+    with span("save_message"):
+        write_buffer.save_message(thread_id, {"role": "user", "content": req.message}, title=chat_title)
 
-    new_state = compiled_graph.invoke(state, config)
+    with span("graph"):
+        new_state = await compiled_graph.ainvoke(state, config)
     print("Thread ID: ", thread_id)
 
     # Find last assistant answer in messages
@@ -106,7 +312,8 @@ async def chat_endpoint(req: ChatRequest):
 
     # SAVE only the last AI message (no need to update title here)
     ai_msg = new_state["messages"][-1]   # last message is always AI
-    save_message(thread_id, {"role": "assistant", "content": ai_msg.content})
+    with span("save_message"):
+        write_buffer.save_message(thread_id, {"role": "assistant", "content": ai_msg.content})
 
     return {
         "answer": answer,
@@ -115,49 +322,149 @@ async def chat_endpoint(req: ChatRequest):
     }
 
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    Server-sent events: one `citations` event, then `token` events as the answer is generated, then `done`.
+    The assistant message is persisted once the stream ends. An answer cut short by an error or a client
+    disconnect is saved with `truncated: True` and left out of the checkpoint and of later turns' history.
+    """
+    thread_id = req.thread_id or str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+    with span("load_history"):
+        seed, prior = await load_prior_messages(thread_id, config, req.history)
+    user_msg = HumanMessage(content=req.message)
+    chat_title = req.message[:50] if len(prior) == 0 else None
+
+    with span("save_message"):
+        write_buffer.save_message(thread_id, {"role": "user", "content": req.message}, title=chat_title)
+
+    async def event_stream():
+        answer = ""
+        completed = False
+        try:
+            flight = single_flight.stream(flight_key(thread_id, prior, req.message),
+                                          lambda: stream_answer(thread_id, prior, req.message))
+            async for kind, data in flight:
+                if kind == "citations":
+                    yield sse_event("citations", {"thread_id": thread_id, "citations": data})
+                else:
+                    answer += data
+                    yield sse_event("token", {"text": data})
+            completed = True
+            yield sse_event("done", {"thread_id": thread_id})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            if completed:
+                write_buffer.save_message(thread_id, {"role": "assistant", "content": answer})
+                # Keep the checkpointed thread in step with what /chat would have produced
+                await compiled_graph.aupdate_state(
+                    config, {"messages": seed + [user_msg, AIMessage(content=answer)]}, as_node="RAG"
+                )
+            else:
+                if answer:
+                    write_buffer.save_message(thread_id, {"role": "assistant", "content": answer, "truncated": True})
+                # The question stays in the checkpoint, as it does in Mongo; the partial answer does not
+                await compiled_graph.aupdate_state(config, {"messages": seed + [user_msg]}, as_node="RAG")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/upload_pdf")
 async def upload_pdf(file: UploadFile = File(...)):
-    # Save PDF to a temporary file
+    """
+    Queues a PDF for ingestion and returns a job id to poll at /jobs/{job_id}.
+    Files whose content was already ingested are skipped.
+    """
+    # Stream the upload to a temporary file, hashing it on the way
     suffix = os.path.splitext(file.filename)[-1]
+    file_hash = hashlib.sha256()
     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp:
-        temp.write(await file.read())
+        while chunk := await file.read(UPLOAD_READ_SIZE):
+            file_hash.update(chunk)
+            temp.write(chunk)
         temp_path = temp.name
+    file_hash = file_hash.hexdigest()
 
-    # Parse, chunk, and embed
-    num_chunks = process_pdf_for_embedding(temp_path)
-    os.remove(temp_path)  # cleanup
+    ingested = await run_blocking(get_ingested_file, file_hash)
+    if ingested:
+        os.remove(temp_path)
+        return {"status": "duplicate", "filename": file.filename, "chunks_added": 0,
+                "previous_filename": ingested["filename"]}
 
-    return {"status": "ok", "filename": file.filename, "chunks_added": num_chunks}
+    job = upload_jobs.submit(temp_path, file.filename, file_hash)
+    return {"status": job["status"], "filename": file.filename, "job_id": job["job_id"]}
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+def conditional_json(request, payload):
+    """
+    JSON response carrying an ETag of its content. If the client's If-None-Match already names that
+    ETag, answers 304 with no body, so an unchanged thread list or thread is not sent again.
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+MAX_MESSAGES_PAGE = 500
 
 @app.get("/get_thread/{thread_id}")
-async def get_thread(thread_id: str):
+async def get_thread(request: Request, thread_id: str, before: int | None = None, limit: int = MESSAGES_PAGE_SIZE):
     """
-    Returns the full chat history for a thread_id.
+    Returns the most recent `limit` messages of a thread, or those before sequence number `before`.
+    `next_before` fetches the previous page while `has_more` is true. Supports If-None-Match.
     """
-    messages = get_thread_messages(thread_id)
-    return {"thread_id": thread_id, "messages": messages}
+    limit = max(1, min(limit, MAX_MESSAGES_PAGE))
+    page = await run_blocking(write_buffer.get_thread_page, thread_id, before, limit)
+    return conditional_json(request, {"thread_id": thread_id, **page})
+
+MAX_THREADS_PAGE = 200
 
 @app.get("/get_threads")
-def get_threads():
-    all_threads = threads.find({}, {"thread_id": 1, "title": 1})
-    thread_list = [{"thread_id": t["thread_id"], "title": t.get("title", "No Title")} for t in all_threads]
-    return thread_list
+async def get_threads(request: Request, after: str | None = None, limit: int = THREADS_PAGE_SIZE):
+    """
+    Threads ordered by last activity, one page at a time. Pass the returned `next_after` as `after`
+    to fetch the next page; it is null on the last page. Supports If-None-Match.
+    """
+    limit = max(1, min(limit, MAX_THREADS_PAGE))
+    try:
+        page, next_after = await run_blocking(list_threads, after, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    thread_list = [{
+        "thread_id": t["thread_id"],
+        "title": t.get("title", "No Title"),
+        "preview": t.get("preview", ""),
+        "message_count": t.get("message_count", 0),
+        "updated_at": t["updated_at"].isoformat() if t.get("updated_at") else None,
+    } for t in page]
+    return conditional_json(request, {"threads": thread_list, "next_after": next_after})
 
 @app.post("/create_thread")
 async def create_thread(data: dict):
     thread_id = data.get("thread_id")
     title = data.get("title", "Untitled Chat")
-    threads.update_one(
-        {"thread_id": thread_id},
-        {"$setOnInsert": {"thread_id": thread_id, "title": title, "messages": []}},
-        upsert=True
-    )
+    await run_blocking(db_create_thread, thread_id, title)
     return {"status": "ok"}
 
 @app.post("/update_thread_title")
 async def update_thread_title(data: dict):
     thread_id = data.get("thread_id")
     title = data.get("title")
-    threads.update_one({"thread_id": thread_id}, {"$set": {"title": title}})
+    await run_blocking(db_update_thread_title, thread_id, title)
     return {"status": "ok"}
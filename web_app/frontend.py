@@ -1,6 +1,10 @@
 import streamlit as st
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict
 import requests
+import threading
+import json
 import uuid
 import os 
 
@@ -123,36 +127,115 @@ st.markdown("""
 
 load_dotenv()
 BACKEND_IMG=os.getenv("BACKEND_IMG")
+# Seconds the thread list and thread pages are reused across reruns before being revalidated
+FRONTEND_CACHE_TTL=int(os.getenv("FRONTEND_CACHE_TTL", "30"))
+ETAG_CACHE_ENTRIES = 256
+
+@st.cache_resource
+def http_session():
+    """One pooled keep-alive session for every rerun and user, instead of a new connection per call."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def etag_cache():
+    """Last (ETag, body) per GET url, for conditional requests; bounded LRU shared by all sessions."""
+    return OrderedDict(), threading.Lock()
+
+def get_json(path, params=None, timeout=10):
+    """GET with If-None-Match: a 304 from the backend reuses the body received last time."""
+    entries, lock = etag_cache()
+    key = (path, tuple(sorted((params or {}).items())))
+    with lock:
+        cached = entries.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = http_session().get(f"{BACKEND_IMG}{path}", params=params, headers=headers, timeout=timeout)
+    if response.status_code == 304 and cached:
+        with lock:
+            entries.move_to_end(key)
+        return cached[1]
+    response.raise_for_status()
+    body = response.json()
+    if response.headers.get("ETag"):
+        with lock:
+            entries[key] = (response.headers["ETag"], body)
+            entries.move_to_end(key)
+            while len(entries) > ETAG_CACHE_ENTRIES:
+                entries.popitem(last=False)
+    return body
+
+@st.cache_data(ttl=FRONTEND_CACHE_TTL, show_spinner=False)
+def fetch_threads(after=None):
+    return get_json("/get_threads", {"after": after} if after else None)
+
+@st.cache_data(ttl=FRONTEND_CACHE_TTL, show_spinner=False)
+def fetch_thread(thread_id, before=None):
+    return get_json(f"/get_thread/{thread_id}", {"before": before} if before is not None else None)
+
+def invalidate_threads(thread_changed=False):
+    """Drops cached listings after a create, rename or chat; the next fetch revalidates with the backend."""
+    fetch_threads.clear()
+    if thread_changed:
+        fetch_thread.clear()
+
+def stream_chat(payload):
+    """Posts to /chat/stream and yields (event, data) pairs from the server-sent events."""
+    with http_session().post(f"{BACKEND_IMG}/chat/stream", json=payload, stream=True, timeout=(10, 90)) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+                event = "message"
 
 with st.sidebar:
         
     st.title("💬 Chats")
-    try:                       
-        threads = requests.get(f"{BACKEND_IMG}/get_threads").json()
+    # Threads come a page at a time, most recent first; "Load more chats" raises the number of pages shown
+    threads = []
+    next_after = None
+    try:
+        for _ in range(st.session_state.get("thread_pages", 1)):
+            page = fetch_threads(next_after)
+            threads.extend(page["threads"])
+            next_after = page["next_after"]
+            if not next_after:
+                break
     except Exception as e:
         st.warning("Couldn't connect to backend. Is it running?")
-        threads = []
 
     selected_thread_id = st.session_state.get("thread_id")
 
     # Display list of threads
     for t in threads:
         if st.button(f"📁 {t['title']}", key=t['thread_id']):
-            thread_data = requests.get(f"{BACKEND_IMG}/get_thread/{t['thread_id']}").json()
+            # Most recent page only; older messages are fetched on demand
+            thread_data = fetch_thread(t["thread_id"])
             st.session_state.messages = thread_data["messages"]
+            st.session_state.older_before = thread_data.get("next_before")
             st.session_state.thread_id = t["thread_id"]
             st.session_state.thread_title = t['title']
+    if next_after and st.button("Load more chats", key="more-threads"):
+        st.session_state.thread_pages = st.session_state.get("thread_pages", 1) + 1
+        st.rerun()
 
     # New chat
     if st.button("➕ New Chat", key="new-chat"):
         st.session_state.messages = []
+        st.session_state.older_before = None
         st.session_state.thread_id = str(uuid.uuid4())
         st.session_state.thread_title = "Untitled Chat"
         # Optionally: notify backend about the new chat (so it's visible in sidebar immediately)
-        requests.post(f"{BACKEND_IMG}/create_thread", json={
+        http_session().post(f"{BACKEND_IMG}/create_thread", json={
             "thread_id": st.session_state.thread_id,
             "title": st.session_state.thread_title
-        })
+        }, timeout=10)
+        invalidate_threads()
 
     # Show editable title for selected chat
     if "thread_id" in st.session_state and st.session_state.thread_id:
@@ -161,14 +244,45 @@ with st.sidebar:
         if new_title != current_title:
             st.session_state.thread_title = new_title
             # Update in backend
-            requests.post(f"{BACKEND_IMG}/update_thread_title", json={
+            http_session().post(f"{BACKEND_IMG}/update_thread_title", json={
                 "thread_id": st.session_state.thread_id,
                 "title": new_title
-            })
+            }, timeout=10)
+            invalidate_threads()
 
     uploaded_pdf = st.file_uploader(" ", type="pdf", label_visibility="collapsed", accept_multiple_files=False)
     if uploaded_pdf:
-        st.success(f"Uploaded: {uploaded_pdf.name}")
+        # Send each file once; Streamlit keeps the uploader value across reruns
+        upload_key = f"{uploaded_pdf.name}:{uploaded_pdf.size}"
+        if st.session_state.get("upload_key") != upload_key:
+            try:
+                result = http_session().post(
+                    f"{BACKEND_IMG}/upload_pdf",
+                    files={"file": (uploaded_pdf.name, uploaded_pdf.getvalue(), "application/pdf")},
+                    timeout=60,
+                ).json()
+                st.session_state.upload_key = upload_key
+                st.session_state.upload_result = result
+            except Exception as e:
+                st.warning(f"Upload failed: {e}")
+        result = st.session_state.get("upload_result", {})
+        if result.get("status") == "duplicate":
+            st.info(f"{uploaded_pdf.name} was already added.")
+        elif result.get("job_id"):
+            try:
+                job = http_session().get(f"{BACKEND_IMG}/jobs/{result['job_id']}", timeout=10).json()
+                if job["status"] == "done":
+                    st.success(f"Added {uploaded_pdf.name} ({job['chunks_embedded']} chunks)")
+                elif job["status"] == "failed":
+                    st.error(f"Could not add {uploaded_pdf.name}: {job['error']}")
+                elif job["status"] == "duplicate":
+                    st.info(f"{uploaded_pdf.name} was already added.")
+                else:
+                    st.info(f"Processing {uploaded_pdf.name}: {job['pages_parsed']} pages parsed, "
+                            f"{job['chunks_embedded']}/{job['chunks_total']} chunks embedded")
+                    st.button("Refresh status", key="refresh-upload")
+            except Exception:
+                st.info(f"Processing {uploaded_pdf.name}...")
 
 col1, col2 = st.columns([0.6, 3.4])
 image_path = os.path.join(os.path.dirname(__file__), "static", "image.png")
@@ -191,10 +305,17 @@ if "thread_id" not in st.session_state:
     st.session_state.thread_id = str(uuid.uuid4())
 
 # Show chat history
+if st.session_state.get("older_before") and st.button("Load older messages", key="load-older"):
+    older = fetch_thread(st.session_state.thread_id, st.session_state.older_before)
+    st.session_state.messages = older["messages"] + st.session_state.messages
+    st.session_state.older_before = older.get("next_before")
+    st.rerun()
 for msg in st.session_state.messages:
     role = msg["role"]
     with st.chat_message(role):
         st.markdown(msg["content"])
+        if msg.get("truncated"):
+            st.caption("This answer was interrupted.")
 
 
 if prompt := st.chat_input("What can I do for you?"):
@@ -203,19 +324,32 @@ if prompt := st.chat_input("What can I do for you?"):
     st.session_state.messages.append({"role": "user", "content": prompt})
 
     # Prepare backend payload
+    # The backend owns the conversation history, so only the new message is sent
     payload = {
         "message": prompt,
-        "history": [m for m in st.session_state.messages if m["role"] == "user" or m["role"] == "assistant"],
         "thread_id": st.session_state.thread_id
     }
-    # Call backend
-    try:
-        response = requests.post(f"{BACKEND_IMG}/chat", json=payload, timeout=90).json()
-        reply = response.get("answer", "[No answer found]")
-        st.session_state.thread_id = response.get("thread_id", st.session_state.thread_id)
-    except Exception as e:
-        reply = f"[Backend error: {e}]"
-
+    # Call backend; tokens are rendered as they arrive
     with st.chat_message("assistant"):
-        st.markdown(reply)
-    st.session_state.messages.append({"role": "assistant", "content": reply})
+        placeholder = st.empty()
+        reply = ""
+        citations = []
+        try:
+            for event, data in stream_chat(payload):
+                if event == "citations":
+                    citations = [f"{c['code']} §{c['clause']}" if c.get("clause") else c["code"]
+                                 for c in data["citations"] if c.get("code")]
+                    st.session_state.thread_id = data.get("thread_id", st.session_state.thread_id)
+                elif event == "token":
+                    reply += data["text"]
+                    placeholder.markdown(reply + "▌")
+                elif event == "error":
+                    reply += f"\n\n[Backend error: {data['detail']}]"
+        except Exception as e:
+            reply = f"[Backend error: {e}]"
+        # The thread gained messages and moved to the top of the list
+        invalidate_threads(thread_changed=True)
+        placeholder.markdown(reply or "[No answer found]")
+        if citations:
+            st.caption("Sources: " + ", ".join(dict.fromkeys(citations)))
+    st.session_state.messages.append({"role": "assistant", "content": reply or "[No answer found]"})
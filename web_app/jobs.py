@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+import uuid
+# file import
+from config.db_config import get_ingested_file, mark_file_ingested
+from pdf_parser import process_pdf_for_embedding
+from pdf_extract import shutdown_pools
+
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+# Seconds a finished job stays pollable at /jobs/{job_id} before it is dropped from memory
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+FINISHED = ("done", "failed", "duplicate")
+
+
+class JobQueue:
+    """
+    Runs PDF ingestion in a background worker pool. Jobs are tracked in memory for status polling
+    and dropped `ttl` seconds after they finish; finished files are recorded in Mongo by content hash
+    so the same file is never ingested twice.
+    """
+
+    def __init__(self, workers=UPLOAD_WORKERS, ttl=JOB_TTL):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self.ttl = ttl
+        self.jobs = {}
+        self.jobs_by_hash = {}
+        # job_id -> finished_at, oldest first
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self):
+        """Drops jobs that finished more than `ttl` seconds ago. Call with the lock held."""
+        cutoff = time.time() - self.ttl
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at > cutoff:
+                break
+            del self._finished[job_id]
+            job = self.jobs.pop(job_id)
+            if self.jobs_by_hash.get(job["file_hash"]) == job_id:
+                del self.jobs_by_hash[job["file_hash"]]
+
+    def submit(self, path, filename, file_hash):
+        """Queues `path` for ingestion and returns the job; identical files already queued share one job."""
+        with self._lock:
+            self._evict_expired()
+            existing = self.jobs_by_hash.get(file_hash)
+            if existing and self.jobs[existing]["status"] in ("queued", "running"):
+                os.remove(path)
+                return dict(self.jobs[existing])
+            job_id = str(uuid.uuid4())
+            job = {
+                "job_id": job_id,
+                "filename": filename,
+                "file_hash": file_hash,
+                "status": "queued",
+                "pages_parsed": 0,
+                "chunks_total": 0,
+                "chunks_embedded": 0,
+                "error": None,
+                "created_at": time.time(),
+            }
+            self.jobs[job_id] = job
+            self.jobs_by_hash[file_hash] = job_id
+            snapshot = dict(job)
+        self.executor.submit(self._run, job_id, path)
+        return snapshot
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self.jobs[job_id].update(fields)
+            if fields.get("status") in FINISHED:
+                self._finished[job_id] = time.time()
+
+    def _run(self, job_id, path):
+        job = self.jobs[job_id]
+        try:
+            # Another upload of the same file may have finished while this one was queued
+            if get_ingested_file(job["file_hash"]):
+                self._update(job_id, status="duplicate")
+                return
+            self._update(job_id, status="running")
+            num_chunks = process_pdf_for_embedding(path, progress=lambda **fields: self._update(job_id, **fields))
+            mark_file_ingested(job["file_hash"], job["filename"], num_chunks)
+            self._update(job_id, status="done")
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            os.remove(path)
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict_expired()
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        shutdown_pools()
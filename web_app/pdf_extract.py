@@ -0,0 +1,104 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import functools
+import multiprocessing
+import os
+import threading
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "25"))
+# Files opened (and, if large, submitted to the pool) while earlier files are still being consumed
+FILE_LOOKAHEAD = 4
+
+# One process pool per worker count, started on first use and reused by every later upload
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def read_metadata(reader, pdf_path):
+    """Basic PDF metadata from an already opened reader."""
+    meta = {"filename": os.path.basename(pdf_path)}
+    try:
+        doc_info = reader.metadata or {}
+        meta["title"] = doc_info.title if doc_info.title else meta["filename"]
+        meta["author"] = doc_info.author if doc_info.author else ""
+    except Exception:
+        meta["title"] = meta["filename"]
+        meta["author"] = ""
+    return meta
+
+
+@functools.lru_cache(maxsize=4)
+def open_pdf(pdf_path, mtime):
+    # Pool workers keep the files they are working on open, so each of a file's tasks doesn't parse it again
+    return PdfReader(pdf_path)
+
+
+def extract_pages(pdf_path, start, end):
+    """Pool task: [(page, text)] for pages [start, end) of the file."""
+    reader = open_pdf(pdf_path, os.path.getmtime(pdf_path))
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, min(end, len(reader.pages)))]
+
+
+def extraction_pool(workers):
+    with _pools_lock:
+        if workers not in _pools:
+            # spawn keeps workers free of the parent's threads and cloud clients
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+
+def shutdown_pools():
+    """Stops the extraction worker processes; a later extraction starts a new pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+def page_documents(pdf_path, meta, total, pages):
+    for page, text in pages:
+        metadata = {"source": pdf_path, "page": page, "total_pages": total}
+        metadata.update(meta)
+        yield Document(page_content=text, metadata=metadata)
+
+
+def iter_pdf_pages(pdf_paths, workers=PDF_EXTRACT_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """
+    Yields one Document per page, in file and page order. Files of more than `pages_per_task` pages
+    are split into page ranges: the first is extracted in-process from the reader that counted the pages,
+    the others by a shared process pool, while later files are already being submitted. Smaller files,
+    or any file when there is one worker or one CPU, are extracted in-process, where starting and feeding
+    worker processes would cost more than the extraction.
+    """
+    pool = extraction_pool(workers) if workers > 1 and (os.cpu_count() or 1) > 1 else None
+    remaining = iter(pdf_paths)
+    ahead = deque()
+
+    def open_next_file():
+        path = next(remaining, None)
+        if path is None:
+            return
+        reader = PdfReader(path)
+        total = len(reader.pages)
+        meta = read_metadata(reader, path)
+        if pool is None or total <= pages_per_task:
+            ahead.append((path, meta, total, reader, total, []))
+        else:
+            # A worker parses the file once for all the ranges it gets (see open_pdf)
+            ahead.append((path, meta, total, reader, pages_per_task,
+                          [pool.submit(extract_pages, path, start, start + pages_per_task)
+                           for start in range(pages_per_task, total, pages_per_task)]))
+
+    for _ in range(FILE_LOOKAHEAD):
+        open_next_file()
+    while ahead:
+        path, meta, total, reader, local_pages, futures = ahead.popleft()
+        open_next_file()
+        pages = ((i, reader.pages[i].extract_text() or "") for i in range(local_pages))
+        yield from page_documents(path, meta, total, pages)
+        for future in futures:
+            yield from page_documents(path, meta, total, future.result())
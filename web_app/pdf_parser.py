@@ -1,94 +1,76 @@
-from langchain_community.document_loaders import PyPDFLoader, PyPDFDirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.schema import Document
-import sys, os
-from web_app.vertex_config import vector_store
-from PyPDF2 import PdfReader
 import os
+from config.vertex_config import get_vector_store, get_embeddings
+from config.answer_cache import bump_store_version
+from config.metrics import span, PDF_PAGES, INGESTED_CHUNKS
+from src.chunker import ClauseSplitter, MAX_CHUNK_CHARS
+from pdf_extract import iter_pdf_pages, PDF_EXTRACT_WORKERS
 
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 120
+def list_pdfs(pdf_path_or_dir):
+    if os.path.isfile(pdf_path_or_dir):
+        return [pdf_path_or_dir]
+    elif os.path.isdir(pdf_path_or_dir):
+        return [os.path.join(pdf_path_or_dir, fname) for fname in sorted(os.listdir(pdf_path_or_dir))
+                if fname.lower().endswith(".pdf")]
+    raise FileNotFoundError(f"No PDF found at: {pdf_path_or_dir}")
 
-def parse_and_chunk_pdf(pdf_path_or_dir):
+def iter_pdf_chunks(pdf_path_or_dir, progress=None, workers=PDF_EXTRACT_WORKERS):
     """
-    Loads and splits PDF file(s) into chunks, adding PDF metadata to each chunk.
+    Streams chunks from PDF file(s): pages are extracted in parallel (see pdf_extract) and split as they arrive,
+    with clauses that run over a page break continuing on the next page.
+    `progress`, if given, is called with pages_parsed as pages come in.
     """
-    chunks = []
+    def pages():
+        pages_parsed = 0
+        for page in iter_pdf_pages(list_pdfs(pdf_path_or_dir), workers=workers):
+            pages_parsed += 1
+            PDF_PAGES.inc()
+            if progress:
+                progress(pages_parsed=pages_parsed)
+            yield page
 
-    # Single PDF file
-    if os.path.isfile(pdf_path_or_dir):
-        loader = PyPDFLoader(pdf_path_or_dir)
-        docs = loader.load()
-        # Try to get PDF metadata (title, author, etc)
-        meta = get_pdf_metadata(pdf_path_or_dir)
-        for doc in docs:
-            # If you want page number: doc.metadata.get("page")
-            doc.metadata.update(meta)
-        chunks.extend(split_docs_with_metadata(docs))
-    # Directory of PDFs
-    elif os.path.isdir(pdf_path_or_dir):
-        for fname in os.listdir(pdf_path_or_dir):
-            if fname.lower().endswith(".pdf"):
-                full_path = os.path.join(pdf_path_or_dir, fname)
-                loader = PyPDFLoader(full_path)
-                docs = loader.load()
-                meta = get_pdf_metadata(full_path)
-                for doc in docs:
-                    doc.metadata.update(meta)
-                chunks.extend(split_docs_with_metadata(docs))
-    else:
-        raise FileNotFoundError(f"No PDF found at: {pdf_path_or_dir}")
+    yield from make_splitter().iter_split(pages())
 
+def parse_and_chunk_pdf(pdf_path_or_dir, progress=None):
+    """
+    Loads and splits PDF file(s) into chunks, adding PDF metadata to each chunk.
+    """
+    with span("pdf_parse"):
+        chunks = list(iter_pdf_chunks(pdf_path_or_dir, progress=progress))
     print(f"Split into {len(chunks)} chunks with metadata.")
     return chunks
 
-def get_pdf_metadata(pdf_path):
-    """Extracts basic PDF metadata using PyPDF2."""
-    meta = {
-        "filename": os.path.basename(pdf_path)
-    }
-    try:
-        reader = PdfReader(pdf_path)
-        doc_info = reader.metadata or {}
-        meta["title"] = doc_info.title if doc_info.title else meta["filename"]
-        meta["author"] = doc_info.author if doc_info.author else ""
-    except Exception:
-        meta["title"] = meta["filename"]
-        meta["author"] = ""
-    return meta
-
-def split_docs_with_metadata(docs):
-    """
-    Split documents using chunking, preserving and copying metadata.
-    """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        add_start_index=True,
-    )
-    out_chunks = []
-    for doc in docs:
-        splits = splitter.split_documents([doc])
-        # Ensure metadata (like filename, title, author) is in each chunk
-        for chunk in splits:
-            chunk.metadata.update(doc.metadata)
-            out_chunks.append(chunk)
-    return out_chunks
+def make_splitter():
+    return ClauseSplitter(max_chars=MAX_CHUNK_CHARS)
 
-def embed_chunks_to_vectorstore(chunks, batch_size=1000):
+def embed_chunks_to_vectorstore(chunks, batch_size=1000, progress=None):
+    """Returns the number of chunks actually stored; less than len(chunks) means a batch failed."""
+    added = 0
     try:
         for i in range(0, len(chunks), batch_size):
             batch = chunks[i:i + batch_size]
-            vector_store.add_documents(batch)
+            with span("ingest_batch"):
+                get_vector_store().add_documents(batch)
+            added += len(batch)
+            INGESTED_CHUNKS.inc(len(batch))
+            if progress:
+                progress(chunks_embedded=added)
             print(f"Added {len(batch)} chunks ({i+1}-{i+len(batch)})")
         print(f"Total: {len(chunks)} chunks with PDF metadata embedded.")
+        if hasattr(get_embeddings(), "stats"):
+            print(f"Embedding cache: {get_embeddings().stats()}")
     except Exception as e:
         print("Error Adding Chunks to Vector Store\n", e)
+    return added
 
-def process_pdf_for_embedding(pdf_path_or_dir):
-    chunks = parse_and_chunk_pdf(pdf_path_or_dir)
-    embed_chunks_to_vectorstore(chunks)
+def process_pdf_for_embedding(pdf_path_or_dir, progress=None):
+    chunks = parse_and_chunk_pdf(pdf_path_or_dir, progress=progress)
+    if progress:
+        progress(chunks_total=len(chunks))
+    added = embed_chunks_to_vectorstore(chunks, progress=progress)
+    if added:
+        bump_store_version()
+    if added < len(chunks):
+        raise RuntimeError(f"Only {added} of {len(chunks)} chunks were added to the vector store")
     return len(chunks)
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+import asyncio
+
+
+class _Broadcast:
+    """Items produced by one streaming flight, replayed to every subscriber."""
+
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Condition()
+        self.task = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical work on the event loop: while a call for `key` is in flight,
+    later callers with the same key wait for it instead of starting their own. The shared work runs
+    as its own task, so a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._streams = {}
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """Returns the result of `await fn()`, sharing one call among concurrent callers with the same key."""
+        task = self._calls.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key, fn):
+        """
+        Yields the items of the async iterator `fn()`, sharing one iteration among concurrent callers
+        with the same key. A caller that joins late first receives everything produced so far.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.started += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            # Keep a reference so the pump is not garbage collected mid-flight
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, fn))
+        else:
+            self.shared += 1
+
+        seen = 0
+        while True:
+            async with broadcast.changed:
+                await broadcast.changed.wait_for(lambda: seen < len(broadcast.items) or broadcast.done)
+                new_items = broadcast.items[seen:]
+                finished = broadcast.done
+            for item in new_items:
+                yield item
+            seen += len(new_items)
+            if finished and seen == len(broadcast.items):
+                if broadcast.error is not None:
+                    raise broadcast.error
+                return
+
+    async def _pump(self, key, broadcast, fn):
+        try:
+            async for item in fn():
+                async with broadcast.changed:
+                    broadcast.items.append(item)
+                    broadcast.changed.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            async with broadcast.changed:
+                broadcast.done = True
+                broadcast.changed.notify_all()
@@ -0,0 +1,178 @@
+"""
+Concurrent crawl engine: a bounded pool of Playwright pages works through a list of codes under
+one global request-rate budget, retrying failures with exponential backoff. Each result is appended
+to a JSONL file as soon as it is scraped, and finished codes are journaled, so an interrupted crawl
+resumes where it stopped when it is started again.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+
+
+class TokenBucket:
+    """
+    Global politeness budget: `rate` requests per second on average, with bursts of up to `burst`.
+    Every navigation of every page awaits `acquire()`. `pause(seconds)` stops all requests for a
+    while, e.g. after the site shows a CAPTCHA.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CompletedJournal:
+    """Append-only record of codes that need no more crawling, one JSON line {"code", "status"} each."""
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.completed[entry["code"]] = entry["status"]
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, code):
+        return code in self.completed
+
+    def add(self, code, status):
+        self.completed[code] = status
+        self._file.write(json.dumps({"code": code, "status": status}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Blocked(Exception):
+    """The site served a CAPTCHA or a rate-limit page; everything pauses before this code is retried."""
+
+
+class BadStatus(Exception):
+    """A page answered with a non-2xx status (an outage or an error page); retried like any other error."""
+
+
+class NotFound(Exception):
+    """The code has nothing to scrape; it is journaled and never retried."""
+
+
+class CrawlEngine:
+    """
+    Runs `fetch(page, code, limiter)` for every code not yet in the journal, with `concurrency`
+    pages open at once. `fetch` returns the record to write (or raises NotFound / Blocked / any
+    other error, which is retried up to `max_retries` times with exponential backoff and jitter).
+    `new_page()` is awaited to open each pooled page and again to replace a page after an error;
+    `close_page(page)` (default: page.close()) releases one.
+    """
+
+    def __init__(self, fetch, new_page, out_path, journal_path, close_page=None, concurrency=4, rate=0.5,
+                 burst=2, max_retries=3, backoff=10.0, max_backoff=300.0, blocked_pause=600.0):
+        self.fetch = fetch
+        self.new_page = new_page
+        self.close_page = close_page or (lambda page: page.close())
+        self.out_path = out_path
+        self.journal_path = journal_path
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.blocked_pause = blocked_pause
+        self.stats = {"saved": 0, "not_found": 0, "failed": 0, "retries": 0, "skipped": 0, "duplicates": 0}
+
+    def _delay(self, attempt):
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def _crawl_one(self, page, code):
+        """Returns (page, record or None, status); the page may have been replaced after an error."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return page, await self.fetch(page, code, self.limiter), "saved"
+            except NotFound:
+                return page, None, "not_found"
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"Error scraping {code}, giving up after {attempt + 1} attempts: {e}")
+                    return page, None, "failed"
+                if isinstance(e, Blocked):
+                    print(f"Blocked while scraping {code}; pausing all requests for {self.blocked_pause:.0f}s")
+                    self.limiter.pause(self.blocked_pause)
+                delay = self._delay(attempt)
+                print(f"Error scraping {code} (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                self.stats["retries"] += 1
+                await asyncio.sleep(delay)
+                # A page left mid-navigation or on an error screen is not worth reusing
+                try:
+                    await self.close_page(page)
+                except Exception:
+                    pass
+                page = await self.new_page()
+
+    async def run(self, codes):
+        journal = CompletedJournal(self.journal_path)
+        unique = list(dict.fromkeys(codes))
+        todo = [code for code in unique if code not in journal]
+        self.stats["skipped"] = len(unique) - len(todo)
+        self.stats["duplicates"] = len(codes) - len(unique)
+        print(f"{len(todo)} codes to crawl, {self.stats['skipped']} already done, "
+              f"{self.stats['duplicates']} duplicates in the input")
+        queue = asyncio.Queue()
+        for code in todo:
+            queue.put_nowait(code)
+        done = 0
+        start = time.monotonic()
+
+        with open(self.out_path, "a", encoding="utf-8") as out:
+            async def worker():
+                nonlocal done
+                page = await self.new_page()
+                try:
+                    while not queue.empty():
+                        code = queue.get_nowait()
+                        page, record, status = await self._crawl_one(page, code)
+                        # Output before journal: a crash in between re-crawls the code, it never loses it
+                        if record is not None:
+                            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                            out.flush()
+                        # Failed codes stay out of the journal, so the next run tries them again
+                        if status != "failed":
+                            journal.add(code, status)
+                        self.stats[status] += 1
+                        done += 1
+                        elapsed = time.monotonic() - start
+                        print(f"[{done}/{len(todo)}] {status}: {code} ({done / elapsed * 3600:.0f} codes/h)")
+                finally:
+                    await self.close_page(page)
+
+            try:
+                await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(todo)))])
+            finally:
+                journal.close()
+        print(f"Crawl finished: {self.stats}")
+        return self.stats
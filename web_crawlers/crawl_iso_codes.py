@@ -1,9 +1,10 @@
 from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
 import pandas as pd
-import re
 import time
 import os
+# file imports
+from extract import extract_published_codes, extract_code_and_title
+from page_store import PageStore
 
 CSV_PATH = "..data/cleaned_ICS.csv" 
 
@@ -19,16 +20,6 @@ def code_list():
     df = pd.read_csv(CSV_PATH)
     return df.identifier.tolist()
 
-def extract_code_and_title(full_list):
-    result = []
-    for line in full_list:
-        match = re.match(r'(ISO(?:/IEC)?\s?\d+(?:-\d+)?:\d{4})\s*(.*)', line)
-        if match:
-            code = match.group(1)
-            title = match.group(2).strip()
-            result.append({'code': code, 'title': title})
-    return result
-
 def already_scraped_codes(csv_path):
     if os.path.exists(csv_path):
         try:
@@ -41,6 +32,18 @@ def already_scraped_codes(csv_path):
 
 CSV_PATH = "iso_codes_and_titles.csv"
 
+def ensure_ics_column(csv_path):
+    """Adds an empty `ics` column to a CSV written before it existed, so appended rows match its header."""
+    if os.path.exists(csv_path):
+        df = pd.read_csv(csv_path)
+        if "ics" not in df.columns:
+            df["ics"] = ""
+            df.to_csv(csv_path, index=False, encoding="utf-8")
+            print(f"Added an empty ics column to {csv_path}.")
+
+store = PageStore()
+ensure_ics_column(CSV_PATH)
+
 with sync_playwright() as p:
     browser = p.chromium.launch(headless=False)
     page = browser.new_page()
@@ -83,26 +86,13 @@ with sync_playwright() as p:
             page.wait_for_timeout(2000)
 
             html = page.content()
-            soup = BeautifulSoup(html, "html.parser")
-
-            iso_codes = []
-            parent_div = soup.find('div', class_="d-xs-flex justify-content-between align-items-center col-12 dt-layout-full col-xs")
-            if parent_div:
-                table = parent_div.find('table', class_="table responsive-table searchable dataTable")
-                if table:
-                    rows = table.find_all('tr')
-                    for row in rows[1:]:
-                        cells = row.find_all(['th', 'td'])
-                        if cells and len(cells) > 1:
-                            stage = cells[1].get_text(strip=True)
-                            if stage == "60.60": # Extracting only the Published ones
-                                iso_codes.append(cells[0].get_text(strip=True))
-                else:
-                    print("Table not found in div.")
-            else:
-                print("Div not found.")
+            # Raw listing kept so reparse.py can rebuild the CSV without crawling again
+            store.put(html, "ics", code, page.url)
+            iso_codes = extract_published_codes(html)
 
             code_title_list = extract_code_and_title(iso_codes)
+            for item in code_title_list:
+                item['ics'] = code  # ICS node the standard was found under, for retrieval subject hints
             if code_title_list:
                 df = pd.DataFrame(code_title_list)
                 # Only write header if the file doesn't exist yet
@@ -117,3 +107,4 @@ with sync_playwright() as p:
         time.sleep(2)  # Be nice to ISO's server!
 
     browser.close()
+    store.close()
@@ -1,12 +1,19 @@
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
 import pandas as pd
-import json
+import argparse
+import asyncio
 import random
-import time
-
-CSV_PATH_IN = "../data/iso_codes_and_titles.csv" 
-JSON_PATH_OUT = "../data/iso_docs.jsonl" 
+# file imports
+from crawl_engine import CrawlEngine, Blocked, BadStatus, NotFound
+from extract import extract_sample_text
+from page_store import PageStore, PAGE_STORE_DIR
+
+CSV_PATH_IN = "../data/iso_codes_and_titles.csv"
+JSON_PATH_OUT = "../data/iso_docs.jsonl"
+# Codes already scraped (or with no sample to scrape); a rerun skips them
+JOURNAL_PATH = "../data/crawled_codes.jsonl"
+BASE_URL = "https://www.iso.org"
+READ_SAMPLE = 'a:has-text("Read sample"), button:has-text("Read sample")'
 
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
@@ -15,119 +22,121 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
 ]
 
-def check_for_captcha(page):
+async def check_for_captcha(page):
     # Look for text or elements commonly found on CAPTCHA pages
     if (
-        page.locator('text="verify you are human"').count() or
-        page.locator('text="are you human"').count() or
-        page.locator('iframe[src*="captcha"]').count() or
-        page.locator('div[class*="captcha"]').count()
+        await page.locator('text="verify you are human"').count() or
+        await page.locator('text="are you human"').count() or
+        await page.locator('iframe[src*="captcha"]').count() or
+        await page.locator('div[class*="captcha"]').count()
     ):
-        print("CAPTCHA detected. Pausing for manual solve...")
-        page.pause()
+        raise Blocked("CAPTCHA detected")
 
-def accept_cookies(page):
+async def accept_cookies(page):
     try:
         btn = page.locator('text="Accept All"')
-        if btn.count():
-            btn.click()
+        if await btn.count():
+            await btn.first.click()
     except Exception:
         pass
 
+def check_response(response):
+    """A 429 pauses the crawl like a CAPTCHA and any other non-2xx status is retried, never taken for "no sample"."""
+    if response is None:
+        return
+    if response.status == 429:
+        raise Blocked(f"HTTP 429 for {response.url}")
+    if not response.ok:
+        raise BadStatus(f"HTTP {response.status} for {response.url}")
+
 def code_list():
     df = pd.read_csv(CSV_PATH_IN)
     return df['ISO Codes'].tolist()
 
-def mouse_move(page, width=1280, height=800, moves=None):
-    """
-    Move the mouse randomly around the page to simulate human activity.
-    """
-    if moves is None:
-        moves = random.randint(3, 8)
-    for _ in range(moves):
-        x = random.randint(0, width - 1)
-        y = random.randint(0, height - 1)
-        steps = random.randint(5, 20)
-        page.mouse.move(x, y, steps=steps)
-        time.sleep(random.uniform(0.2, 1.0))
-
-def random_scroll(page, times=None):
-    """
-    Randomly scrolls the page to simulate reading.
-    """
-    if times is None:
-        times = random.randint(2, 5)
-    for _ in range(times):
-        scroll_y = random.randint(100, 600)
-        page.evaluate(f"window.scrollBy(0, {scroll_y})")
-        time.sleep(random.uniform(0.5, 1.5))
-
-with sync_playwright() as p:
-    browser = p.chromium.launch(headless=False)
-    codes = code_list()
-
-    iterator = 0 #6401 
-
-    for idx, code in enumerate(codes[iterator:]): 
-        print(f"[{iterator}/{len(codes)}] Processing: {code}")
-        iterator+=1
-        ua = random.choice(USER_AGENTS)  
-        context = browser.new_context(user_agent=ua)
-        page = context.new_page()
+async def fetch_sample(page, code, limiter, base_url=BASE_URL, store=None):
+    """Searches for `code`, opens its page and its "Read sample" preview; every navigation spends from the rate budget.
+    The raw sample page is kept in `store` so reparse.py can re-extract it later."""
+    await limiter.acquire()
+    check_response(await page.goto(f"{base_url}/home.html"))
+    await check_for_captcha(page)
+    await accept_cookies(page)
+    await page.fill('input[type="search"]', code)
+    await limiter.acquire()
+    await page.keyboard.press('Enter')
+    await page.wait_for_load_state('domcontentloaded')
+    await check_for_captcha(page)
+    await accept_cookies(page)
+    await page.wait_for_selector(f'a:has-text("{code}")', timeout=15000)
+
+    await limiter.acquire()
+    async with page.expect_navigation() as navigation:
+        await page.click(f'a:has-text("{code}")')
+    # Timeouts up to here, and error statuses, are retried; only a standard's page that loaded fine can lack a sample
+    check_response(await navigation.value)
+    await page.wait_for_load_state('networkidle')
+    await check_for_captcha(page)
+    await accept_cookies(page)
+    try:
+        await page.wait_for_selector(READ_SAMPLE, timeout=15000)
+    except PlaywrightTimeout:
+        # The standard's page loaded with a 2xx status but offers no preview
+        raise NotFound(f"No sample for {code}")
+
+    await limiter.acquire()
+    await page.click(READ_SAMPLE)
+    await check_for_captcha(page)
+    await accept_cookies(page)
+    await page.wait_for_selector('div.sts-standard', timeout=20000)
+    html = await page.content()
+    if store:
+        # zstd and SQLite are blocking; keep them off the event loop the other pages share
+        await asyncio.to_thread(store.put, html, "sample", code, page.url)
+    return {"code": code, "text": extract_sample_text(html)}
+
+async def crawl(args):
+    codes = code_list()[args.start:args.limit]
+    store = PageStore(args.page_store) if args.page_store else None
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=not args.headed)
+
+        async def new_page():
+            # Each pooled page gets its own context, so cookies and user agent differ per worker
+            context = await browser.new_context(user_agent=random.choice(USER_AGENTS))
+            return await context.new_page()
+
+        async def close_page(page):
+            await page.context.close()
+
+        async def fetch(page, code, limiter):
+            return await fetch_sample(page, code, limiter, base_url=args.base_url, store=store)
+
+        engine = CrawlEngine(fetch, new_page, args.out, args.journal, close_page=close_page,
+                             concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+                             max_retries=args.retries, backoff=args.backoff, blocked_pause=args.blocked_pause)
         try:
-            page.goto('https://www.iso.org/home.html')
-            check_for_captcha(page)
-            accept_cookies(page)
-            time.sleep(random.uniform(2, 5)) 
-            mouse_move(page)
-            page.fill('input[type="search"]', code)
-            page.keyboard.press('Enter')
-            accept_cookies(page)
-            page.wait_for_selector(f'a:has-text("{code}")', timeout=15000)
-
-            mouse_move(page)
-            random_scroll(page)
-            accept_cookies(page)
-            page.click(f'a:has-text("{code}")')
-            page.wait_for_load_state('networkidle')
-            accept_cookies(page)
-            page.wait_for_selector('a:has-text("Read sample"), button:has-text("Read sample")', timeout=15000)
-            random_scroll(page)
-            accept_cookies(page)
-            time.sleep(random.uniform(2, 4))
-            page.click('a:has-text("Read sample"), button:has-text("Read sample")')
-            accept_cookies(page)
-            random_scroll(page)
-
-            page.wait_for_selector('div.sts-standard', timeout=20000)
-            accept_cookies(page)
-            mouse_move(page)
-            html = page.content()
-            soup = BeautifulSoup(html, "html.parser")
-
-            sample_div = soup.find('div', class_="sts-standard")
-            if sample_div:
-                text = sample_div.get_text(separator='\n', strip=True) 
-            else: 
-                text = soup.get_text(separator='\n', strip=True)
-            result = {"code": code, "text": text}
-            with open(JSON_PATH_OUT, "a", encoding="utf-8") as f:
-                f.write(json.dumps(result, ensure_ascii=False) + "\n")
-            print(f"Saved {code}")
-
-        except Exception as e:
-            print(f"Error scraping {code}: {e}")
+            await engine.run(codes)
         finally:
-            mouse_move(page)
-            time.sleep(2) 
-            context.close()
-
-        time.sleep(random.uniform(5, 11))
-
-        if (idx + 1) % 25 == 0:
-            print("Taking a long break...")
-            time.sleep(random.uniform(300, 600)) 
-
-    browser.close()
+            await browser.close()
+            if store:
+                store.close()
     print('Completed')
 
+def main():
+    parser = argparse.ArgumentParser(description="Scrapes the sample text of every ISO code into a JSONL file.")
+    parser.add_argument("--base-url", default=BASE_URL, help="site to crawl; point at fixture_server.py for testing")
+    parser.add_argument("--out", default=JSON_PATH_OUT)
+    parser.add_argument("--journal", default=JOURNAL_PATH)
+    parser.add_argument("--page-store", default=PAGE_STORE_DIR, help="where raw pages are kept for reparse.py; '' to disable")
+    parser.add_argument("--concurrency", type=int, default=4, help="pages open at once")
+    parser.add_argument("--rate", type=float, default=0.5, help="requests per second across all pages")
+    parser.add_argument("--burst", type=int, default=2)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=10.0, help="first retry delay in seconds, doubled each attempt")
+    parser.add_argument("--blocked-pause", type=float, default=600.0, help="seconds all requests stop after a CAPTCHA")
+    parser.add_argument("--start", type=int, default=0, help="first code in the CSV to consider")
+    parser.add_argument("--limit", type=int, default=None, help="stop before this code index")
+    parser.add_argument("--headed", action="store_true", help="show the browser windows")
+    asyncio.run(crawl(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
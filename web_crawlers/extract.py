@@ -0,0 +1,75 @@
+"""
+Extraction of the crawled pages, shared by the crawlers and by reparse.py. Pages are parsed with
+lxml, which is several times faster than BeautifulSoup's html.parser on these pages; the text
+is joined the way BeautifulSoup's get_text() joined it, so existing output stays comparable.
+"""
+import re
+import lxml.html
+
+SAMPLE_XPATH = "//div[contains(concat(' ', normalize-space(@class), ' '), ' sts-standard ')]"
+ICS_DIV_CLASS = "d-xs-flex justify-content-between align-items-center col-12 dt-layout-full col-xs"
+ICS_TABLE_CLASS = "table responsive-table searchable dataTable"
+PUBLISHED_STAGE = "60.60"
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+CODE_TITLE_RE = re.compile(r'(ISO(?:/IEC)?\s?\d+(?:-\d+)?:\d{4})\s*(.*)')
+
+
+def strings(element):
+    """Stripped, non-empty text pieces under `element` in document order, skipping scripts and comments."""
+    if not isinstance(element.tag, str) or element.tag in SKIPPED_TAGS:
+        return
+    if element.text and element.text.strip():
+        yield element.text.strip()
+    for child in element:
+        yield from strings(child)
+        if child.tail and child.tail.strip():
+            yield child.tail.strip()
+
+
+def get_text(element, separator=""):
+    return separator.join(strings(element))
+
+
+def parse(html):
+    try:
+        return lxml.html.fromstring(html)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        return lxml.html.fromstring(html.encode("utf-8"))
+
+
+def extract_sample_text(html):
+    """Text of the standard's sample (`div.sts-standard`), or of the whole page if it has none."""
+    root = parse(html)
+    sample = root.xpath(SAMPLE_XPATH)
+    return get_text(sample[0] if sample else root, separator="\n")
+
+
+def extract_published_codes(html):
+    """'<code> <title>' entries of the ICS listing table whose stage is 60.60 (published)."""
+    root = parse(html)
+    parent = [div for div in root.iter("div") if " ".join((div.get("class") or "").split()) == ICS_DIV_CLASS]
+    if not parent:
+        print("Div not found.")
+        return []
+    table = [t for t in parent[0].iter("table") if " ".join((t.get("class") or "").split()) == ICS_TABLE_CLASS]
+    if not table:
+        print("Table not found in div.")
+        return []
+    entries = []
+    for row in list(table[0].iter("tr"))[1:]:
+        cells = [cell for cell in row.iter("th", "td")]
+        if len(cells) > 1 and get_text(cells[1]) == PUBLISHED_STAGE:
+            entries.append(get_text(cells[0]))
+    return entries
+
+
+def extract_code_and_title(full_list):
+    result = []
+    for line in full_list:
+        match = CODE_TITLE_RE.match(line)
+        if match:
+            code = match.group(1)
+            title = match.group(2).strip()
+            result.append({'code': code, 'title': title})
+    return result
@@ -0,0 +1,144 @@
+"""
+Local stand-in for iso.org, for testing the crawlers without touching the real site. It serves
+saved sample pages (one `<slug>.html` per code in --pages) behind the same steps the crawler
+takes: home page with a search box -> search results -> standard page -> "Read sample".
+
+    python fixture_server.py --pages ./fixture_pages --port 8765 --fail-rate 0.1 --latency 0.2
+    python fixture_server.py --pages ./fixture_pages --generate ../data/iso_codes_and_titles.csv --limit 50
+    python crawl_iso_data.py --base-url http://127.0.0.1:8765 --rate 20 --concurrency 8
+
+--fail-rate answers that share of requests with 503 and --captcha-rate with a CAPTCHA page,
+to exercise retries and backoff; --fail-first answers the first N requests for every URL with 503,
+so every page needs N retries.
+"""
+import argparse
+import html
+import os
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+HOME_PAGE = """<html><body>
+<button>Accept All</button>
+<form action="/search" method="get"><input type="search" name="q"></form>
+</body></html>"""
+CAPTCHA_PAGE = """<html><body><div class="captcha">Please verify you are human</div></body></html>"""
+
+
+def slug(code):
+    return re.sub(r"[^A-Za-z0-9]+", "-", code).strip("-")
+
+
+def write_sample_pages(pages_dir, codes):
+    """Synthetic saved pages: a sample div with a few clauses per code."""
+    os.makedirs(pages_dir, exist_ok=True)
+    for code in codes:
+        clauses = "".join(
+            f"<h2>{n} Clause {n}</h2><p>{html.escape(code)} requirement {n}: the organization shall "
+            f"establish, implement and maintain a process for topic {n}.</p>" for n in range(1, 6))
+        page = (f"<html><body><h1>{html.escape(code)}</h1><nav>Menu</nav>"
+                f'<div class="sts-standard">{clauses}</div><footer>Footer</footer></body></html>')
+        with open(os.path.join(pages_dir, f"{slug(code)}.html"), "w", encoding="utf-8") as f:
+            f.write(page)
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    pages_dir = "."
+    fail_rate = 0.0
+    captcha_rate = 0.0
+    latency = 0.0
+    fail_first = 0
+    # {request path: times requested}, per server (see start_fixture_server)
+    requests_seen = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _saved_page(self, name):
+        path = os.path.join(self.pages_dir, f"{name}.html")
+        if not os.path.isfile(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            seen = self.requests_seen.get(self.path, 0)
+            self.requests_seen[self.path] = seen + 1
+        if seen < self.fail_first or random.random() < self.fail_rate:
+            return self._send(503, "Service unavailable")
+        if random.random() < self.captcha_rate:
+            return self._send(200, CAPTCHA_PAGE)
+
+        url = urlparse(self.path)
+        if url.path in ("/", "/home.html"):
+            return self._send(200, HOME_PAGE)
+        if url.path == "/search":
+            code = parse_qs(url.query).get("q", [""])[0].strip()
+            found = self._saved_page(slug(code)) is not None
+            link = f'<a href="/standard/{slug(code)}.html">{html.escape(code)}</a>' if found else "<p>No results</p>"
+            return self._send(200, f"<html><body>{HOME_PAGE}<ul><li>{link}</li></ul></body></html>")
+        match = re.fullmatch(r"/(standard|sample)/([A-Za-z0-9-]+)\.html", url.path)
+        page = self._saved_page(match.group(2)) if match else None
+        if page is None:
+            return self._send(404, "Not found")
+        if match.group(1) == "standard":
+            return self._send(200, f'<html><body><h1>{match.group(2)}</h1>'
+                                   f'<a href="/sample/{match.group(2)}.html">Read sample</a></body></html>')
+        return self._send(200, page)
+
+
+def start_fixture_server(pages_dir, port=0, fail_rate=0.0, captcha_rate=0.0, latency=0.0, fail_first=0):
+    """Serves `pages_dir` on a background thread; returns (server, base_url). Stop with server.shutdown()."""
+    handler = type("Handler", (FixtureHandler,), {"pages_dir": pages_dir, "fail_rate": fail_rate,
+                                                  "captcha_rate": captcha_rate, "latency": latency,
+                                                  "fail_first": fail_first, "requests_seen": {},
+                                                  "lock": threading.Lock()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="fixture_pages", help="directory of saved <slug>.html sample pages")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests for each URL with 503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--generate", help="write synthetic pages for the codes in this CSV ('ISO Codes' column) and exit")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.generate:
+        import pandas as pd
+        codes = pd.read_csv(args.generate)["ISO Codes"].tolist()[:args.limit]
+        write_sample_pages(args.pages, codes)
+        print(f"Wrote {len(codes)} pages to {args.pages}")
+        return
+    server, base_url = start_fixture_server(args.pages, args.port, args.fail_rate, args.captcha_rate, args.latency,
+                                            args.fail_first)
+    print(f"Serving {args.pages} at {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Raw HTML captured by the crawlers, so extraction can be fixed and rerun without crawling again.
+Pages are stored once per distinct content as zstd blobs named by their SHA-256, and a SQLite
+index records every capture by kind ("sample", "ics"), code and URL.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zstandard
+
+PAGE_STORE_DIR = "../data/page_store"
+ZSTD_LEVEL = 10
+
+
+class PageStore:
+    def __init__(self, root=PAGE_STORE_DIR, level=ZSTD_LEVEL):
+        self.root = root
+        self.level = level
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, code TEXT NOT NULL, "
+            "url TEXT, sha256 TEXT NOT NULL, size INTEGER, stored_size INTEGER, fetched_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_kind_code ON pages (kind, code, fetched_at)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def blob_path(self, sha256):
+        return blob_path(self.root, sha256)
+
+    def put(self, html, kind, code, url=None):
+        """Stores one capture; identical content is written once. Returns its SHA-256."""
+        data = html.encode("utf-8")
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(sha256)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zstandard.ZstdCompressor(level=self.level).compress(data))
+            os.replace(tmp, path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pages (kind, code, url, sha256, size, stored_size, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, code, url, sha256, len(data), os.path.getsize(path), time.time()),
+            )
+            self._conn.commit()
+        return sha256
+
+    def get(self, sha256):
+        return read_blob(self.root, sha256)
+
+    def latest(self, kind):
+        """(code, url, sha256) of the most recent capture of each code of this kind, ordered by code."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT code, url, sha256 FROM (SELECT code, url, sha256, ROW_NUMBER() OVER "
+                "(PARTITION BY code ORDER BY fetched_at DESC, id DESC) AS rn FROM pages WHERE kind = ?) "
+                "WHERE rn = 1 ORDER BY code",
+                (kind,),
+            ).fetchall()
+
+    def stats(self):
+        with self._lock:
+            captures, codes, blobs = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT kind || ':' || code), COUNT(DISTINCT sha256) FROM pages"
+            ).fetchone()
+            raw, stored = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM "
+                "(SELECT sha256, MAX(size) AS size, MAX(stored_size) AS stored_size FROM pages GROUP BY sha256)"
+            ).fetchone()
+        return {"captures": captures, "codes": codes, "blobs": blobs, "raw_bytes": raw, "stored_bytes": stored}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def blob_path(root, sha256):
+    return os.path.join(root, "blobs", sha256[:2], f"{sha256}.html.zst")
+
+
+def read_blob(root, sha256):
+    """Decompressed HTML of one blob; usable from worker processes without opening the index."""
+    with open(blob_path(root, sha256), "rb") as f:
+        return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
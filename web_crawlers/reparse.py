@@ -0,0 +1,134 @@
+"""
+Rebuilds iso_docs.jsonl and iso_codes_and_titles.csv from the raw page store, without crawling:
+the latest capture of every code is decompressed and re-extracted (extract.py) across a process pool.
+Run it after changing extract.py.
+
+Codes the store has no page for (everything crawled before the store existed) keep their rows from
+the existing file; --replace drops them and keeps only what the store holds.
+
+    python reparse.py --workers 8
+    python reparse.py --only docs --docs-out /tmp/iso_docs.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+# file imports
+from page_store import PageStore, PAGE_STORE_DIR, read_blob
+from extract import extract_sample_text, extract_published_codes, extract_code_and_title
+
+DOCS_OUT = "../data/iso_docs.jsonl"
+CODES_OUT = "../data/iso_codes_and_titles.csv"
+TASK_SIZE = 64
+
+
+def parse_samples(root, rows):
+    """Process-pool task: {"code", "text"} records for a slice of sample captures."""
+    return [{"code": code, "text": extract_sample_text(read_blob(root, sha256))} for code, _, sha256 in rows]
+
+
+def parse_ics_pages(root, rows):
+    """Process-pool task: {"code", "title", "ics"} for the published standards on a slice of ICS listing pages."""
+    found = []
+    for ics, _, sha256 in rows:
+        for item in extract_code_and_title(extract_published_codes(read_blob(root, sha256))):
+            item["ics"] = ics
+            found.append(item)
+    return found
+
+
+def run_tasks(pool, fn, root, rows):
+    tasks = [rows[i:i + TASK_SIZE] for i in range(0, len(rows), TASK_SIZE)]
+    # map keeps the store's code order, so the output is the same for any number of workers
+    for results in pool.map(fn, [root] * len(tasks), tasks):
+        yield from results
+
+
+def existing_docs(path, reparsed):
+    """Records of `path` whose code was not reparsed, in file order."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        records = (json.loads(line) for line in f if line.strip())
+        return [record for record in records if record.get("code") not in reparsed]
+
+
+def existing_codes(path, reparsed):
+    """(code, title, ics) rows of `path` whose code was not reparsed; files from before the ics column get ""."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = []
+        for row in csv.DictReader(f):
+            code = row.get("ISO Codes") or row.get("code")
+            if code and code not in reparsed:
+                rows.append([code, row.get("Title") or row.get("title", ""), row.get("ics") or ""])
+        return rows
+
+
+def write_atomically(path, write):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", default=PAGE_STORE_DIR)
+    parser.add_argument("--docs-out", default=DOCS_OUT)
+    parser.add_argument("--codes-out", default=CODES_OUT)
+    parser.add_argument("--only", choices=["docs", "codes"], help="regenerate just one of the outputs")
+    parser.add_argument("--replace", action="store_true",
+                        help="write only what the store holds, dropping existing rows for codes it has no page for")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    store = PageStore(args.store)
+    print(f"Page store: {store.stats()}")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if args.only != "codes":
+            start = time.perf_counter()
+            rows = store.latest("sample")
+            kept = [] if args.replace else existing_docs(args.docs_out, {code for code, _, _ in rows})
+            count = 0
+
+            def write_docs(f):
+                nonlocal count
+                for record in run_tasks(pool, parse_samples, args.store, rows):
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+                for record in kept:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            write_atomically(args.docs_out, write_docs)
+            elapsed = time.perf_counter() - start
+            print(f"Wrote {count} reparsed docs and kept {len(kept)} existing ones in {args.docs_out} "
+                  f"in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} pages/s)")
+
+        if args.only != "docs":
+            start = time.perf_counter()
+            rows = store.latest("ics")
+            items = list(run_tasks(pool, parse_ics_pages, args.store, rows))
+            kept = [] if args.replace else existing_codes(args.codes_out, {item["code"] for item in items})
+            seen = set()
+
+            def write_codes(f):
+                writer = csv.writer(f)
+                # Column names crawl_iso_data.py and the query analyzer read
+                writer.writerow(["ISO Codes", "Title", "ics"])
+                for item in items:
+                    # A standard listed under several ICS nodes keeps the first one, as the crawl did
+                    if item["code"] not in seen:
+                        seen.add(item["code"])
+                        writer.writerow([item["code"], item["title"], item["ics"]])
+                writer.writerows(kept)
+            write_atomically(args.codes_out, write_codes)
+            print(f"Wrote {len(seen)} codes from {len(rows)} ICS pages and kept {len(kept)} existing ones in "
+                  f"{args.codes_out} in {time.perf_counter() - start:.1f}s")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()